@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core.apps.CoreConfig',
     'accounts.apps.AccountsConfig',
     'substitut_search.apps.SubstitutSearchConfig',
@@ -88,6 +89,30 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# The 'results' cache stores the results of the searches and substitutes.
+# Each worker keeps its own local-memory cache, a shared backend
+# (memcached, database) lets the workers share their results.
+# The command warm_cache, and the option --warm of the imports,
+# need a shared backend: the web workers can't read the local memory
+# of the command
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'results': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'results',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Alias of the cache storing the results
+RESULTS_CACHE = 'results'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -126,6 +151,11 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Engine used to find the substitutes of a product:
+# 'memory' keeps an index of the categories in each worker,
+# 'database' uses the precomputed substitutes or a query
+SUBSTITUTES_ENGINE = 'database'
+
 # Url to redirect to after login or logout
 LOGIN_REDIRECT_URL = '/accounts/myaccount/'
 LOGOUT_REDIRECT_URL = '/'
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PurBeurre_WebApp.settings')
 
 application = get_wsgi_application()
+
+# Load the in-memory index of the categories when the worker starts,
+# if the setting SUBSTITUTES_ENGINE is 'memory'
+from substitut_search.utils.category_index import category_index
+category_index.load()
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_auto_20200409_1851'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='tags_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -5,10 +5,13 @@ class Profile(models.Model):
     """A Profile is attached at each User to store additionnal informations.
     fields:
     -user: The User at wich the Profile is attached
-    -favories: All the products that the user has saved"""
+    -favories: All the products that the user has saved
+    -tags_version: Incremented each time the tags of the favories
+    may change, to know in every process that the cached tags are stale"""
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     favories = models.ManyToManyField(
         'substitut_search.Product', through='substitut_search.Favory')
+    tags_version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.user.username
@@ -12,5 +12,6 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    """Each time a user is saved, saves the attached Profile"""
-    instance.profile.save()
+    """Each time a user is saved, saves the attached Profile.
+    The tags version is only incremented by queries, so it isn't written"""
+    instance.profile.save(update_fields=['user'])
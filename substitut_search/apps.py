@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class SubstitutSearchConfig(AppConfig):
     name = 'substitut_search'
+
+    def ready(self):
+        from . import lookups
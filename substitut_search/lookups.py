@@ -0,0 +1,22 @@
+from django.db.models import CharField, FloatField, Func, Value
+from django.contrib.postgres.lookups import PostgresSimpleLookup
+
+
+@CharField.register_lookup
+class TrigramWordSimilar(PostgresSimpleLookup):
+    """True if the query is similar to a word or a part of the field,
+    according to the pg_trgm 'word_similarity_threshold'.
+    Unlike 'trigram_similar', a short query can match a long name"""
+    lookup_name = 'trigram_word_similar'
+    operator = '%%>'
+
+
+class TrigramWordSimilarity(Func):
+    """Greatest similarity between the query and a part of the field"""
+    function = 'WORD_SIMILARITY'
+    output_field = FloatField()
+
+    def __init__(self, string, expression, **extra):
+        if not hasattr(string, 'resolve_expression'):
+            string = Value(string)
+        super().__init__(string, expression, **extra)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from substitut_search.utils.queries import (
+    NB_POPULAR_QUERIES, WINDOW_DAYS, aggregate_queries)
+from substitut_search.views import NB_DISPLAYED_PRODUCTS
+
+
+class Command(BaseCommand):
+    """Add the command to aggregate the logged searches
+    in the table of the popular queries"""
+    help = ('Count the searches of the last days, and precompute '
+            'the results of the most searched queries')
+
+    def add_arguments(self, parser):
+        """Add optional arguments
+        --count: the number of popular queries kept
+        --days: the number of days of searches counted"""
+        parser.add_argument('--count', type=int, default=NB_POPULAR_QUERIES)
+        parser.add_argument('--days', type=int, default=WINDOW_DAYS)
+
+    def handle(self, *args, **options):
+        """Replace the popular queries, then display the most searched.
+        The web workers rank the suggestions with the new popular queries
+        at their next check of the prefix index"""
+        popular = aggregate_queries(
+            NB_DISPLAYED_PRODUCTS, options['count'], options['days'])
+        for query in popular[:10]:
+            self.stdout.write(f'{query.query}: {query.count} searches')
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully aggregated {len(popular)} popular queries'))
@@ -0,0 +1,87 @@
+import time
+import timeit
+
+from django.core.management.base import BaseCommand
+
+import numpy as np
+
+from substitut_search.models import Product
+from substitut_search.utils.category_index import load_category_index
+from substitut_search.utils.random_pool import sample_codes
+from substitut_search.utils.ranking import rank_substitutes
+from substitut_search.utils.substitutes import search_substitutes
+from substitut_search.views import NB_DISPLAYED_PRODUCTS
+
+
+class Command(BaseCommand):
+    """Add the command to measure the time needed to rank
+    the candidate substitutes, and to find the substitutes
+    of the products of the database"""
+    help = ('Measure the time needed to rank sets of candidate substitutes, '
+            'then to find the substitutes of random products, '
+            'with the query and the in-memory index')
+
+    def add_arguments(self, parser):
+        """Add optional arguments
+        --sizes: the numbers of generated candidates to rank
+        --products: the number of random products searched, 0 to only
+        measure the ranking
+        --repeat: the number of rankings and searches measured
+        for each size and product"""
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--products', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        """Display the mean time of the ranking of each size,
+        then the mean and p99 time of a search with each engine"""
+        for size in options['sizes']:
+            self.benchmark_ranking(size, options['repeat'])
+        if options['products'] > 0:
+            self.benchmark_find(options['products'], options['repeat'])
+
+    def benchmark_ranking(self, size, repeat):
+        """Rank random candidates with 10% of missing nutrients"""
+        random = np.random.RandomState(0)
+        initial = random.uniform(0, 30, 4)
+        candidates = random.uniform(0, 30, (size, 4))
+        candidates[random.rand(size, 4) < 0.1] = np.nan
+        depths = random.randint(0, 8, size)
+        nutriscores = random.randint(0, 5, size)
+        duration = timeit.timeit(
+            lambda: rank_substitutes(
+                initial, candidates, depths, nutriscores),
+            number=repeat) / repeat
+        self.stdout.write(
+            f'{size} candidates ranked in {duration*1000:.2f} ms '
+            f'({size/duration:,.0f} candidates/s)')
+
+    def benchmark_find(self, count, repeat):
+        """Find the substitutes of 'count' random products"""
+        products = list(Product.objects.filter(code__in=sample_codes(count)))
+        if not products:
+            self.stdout.write('No product to search')
+            return
+        start = time.perf_counter()
+        index = load_category_index()
+        self.stdout.write(
+            f'index of {len(index)} products built '
+            f'in {time.perf_counter() - start:.1f} s')
+        engines = {
+            'query': lambda product: search_substitutes(
+                product, NB_DISPLAYED_PRODUCTS),
+            'memory': lambda product: index.find(
+                product.pk, NB_DISPLAYED_PRODUCTS),
+        }
+        for name, find in engines.items():
+            times = []
+            for product in products:
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    find(product)
+                    times.append(time.perf_counter() - start)
+            self.stdout.write(
+                f'{name}: {len(products)} products, '
+                f'mean {np.mean(times)*1000:.2f} ms, '
+                f'p99 {np.percentile(times, 99)*1000:.2f} ms')
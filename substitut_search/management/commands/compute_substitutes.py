@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from substitut_search.utils.substitutes import compute_substitutes
+
+class Command(BaseCommand):
+    """Add the command to precompute the substitutes of the products"""
+    help = 'Precompute the substitutes of the products'
+
+    def add_arguments(self, parser):
+        """Add an optional argument
+        --all: compute the substitutes of all the products,
+        instead of only the products affected by the last changes"""
+        parser.add_argument('--all', action='store_true')
+
+    def handle(self, *args, **options):
+        """Compute the substitutes and display the number
+        of products computed"""
+        count = compute_substitutes(incremental=not options['all'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully computed the substitutes of {count} products'))
@@ -0,0 +1,59 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from substitut_search.utils.dump import DumpImporter
+from substitut_search.utils.warmup import LOCAL_CACHE_ERROR, shared_results
+from substitut_search.models import Product
+
+
+class Command(BaseCommand):
+    """Add the command to fill the database from an OpenFoodFacts dump
+    stored locally, instead of dowloading the products"""
+    help = 'Insert the products of an OpenFoodFacts dump (JSONL or CSV, gzip)'
+
+    def add_arguments(self, parser):
+        """Add a positional argument
+        path: the path of the dump, ending with .jsonl, .csv or .gz
+        and optional arguments
+        --workers: the number of processes parsing and writing the dump
+        --swap: load the products in a new catalog, then replace the live
+        catalog, keeping the favories
+        --warm: fill the results cache once the products are imported"""
+        parser.add_argument('path')
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--swap', action='store_true')
+        parser.add_argument('--warm', action='store_true')
+
+    def report(self, stats):
+        """Display the progress of the import"""
+        self.stdout.write(
+            f'{stats.downloaded} products read, {stats.rejected} rejected')
+
+    def handle(self, *args, **options):
+        """-Insert the valid products of the dump, ignoring the products
+        already in the database, or replace the catalog by the products
+        of the dump, while displaying the progress.
+        -Display the number of products inserted and the throughput.
+        -Search the popular queries again in the new catalog."""
+        if options['warm'] and not shared_results():
+            raise CommandError(LOCAL_CACHE_ERROR)
+        importer = DumpImporter(
+            options['path'], workers=options['workers'],
+            progress=self.report)
+        try:
+            if options['swap']:
+                stats = importer.rebuild_products()
+            else:
+                stats = importer.insert_products()
+        except OSError as error:
+            raise CommandError(f'Unable to read the dump: {error}')
+        self.report(stats)
+        count = Product.objects.count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully insered {stats.inserted} products, '
+            f'{count} products in the database ({stats.rate:.0f} products/s)'))
+        #  the popular queries were searched in the previous catalog
+        call_command(
+            'aggregate_queries', stdout=self.stdout, stderr=self.stderr)
+        if options['warm']:
+            call_command('warm_cache', stdout=self.stdout, stderr=self.stderr)
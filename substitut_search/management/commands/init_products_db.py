@@ -1,7 +1,13 @@
+from django.core.management import call_command
 from django.core.management.base import BaseCommand, CommandError
 
+from substitut_search.utils.downloader import CONCURRENCY
 from substitut_search.utils.fill_db import FillDB
-from substitut_search.models import Product
+from substitut_search.utils.warmup import LOCAL_CACHE_ERROR, shared_results
+from substitut_search.models import ImportCheckpoint, Product
+
+#  Name of the checkpoints saved by this command
+COMMAND = 'init_products_db'
 
 class Command(BaseCommand):
     """Add the command to init the database by dowloading
@@ -10,14 +16,80 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         """Add a positional argument
-        n_products: the number of products to download"""
+        n_products: the number of products to download
+        and optional arguments
+        --concurrency: the number of pages downloaded at the same time
+        --workers: the number of processes downloading, parsing and writing
+        the pages, sharing the rate limit of OpenFoodFacts. The workers
+        don't save checkpoints, and can't load a swapped catalog
+        --http-cache: a directory where the downloaded pages are recorded,
+        and replayed during the next imports
+        --offline: only use the pages recorded in the --http-cache directory
+        --swap: load the products in a new catalog, then replace the live
+        catalog, keeping the favories
+        --resume: continue the last import, after its last checkpoint
+        --warm: fill the results cache once the products are imported"""
         parser.add_argument('n_products', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--http-cache', dest='cache_dir')
+        parser.add_argument('--offline', action='store_true')
+        parser.add_argument('--swap', action='store_true')
+        parser.add_argument('--resume', action='store_true')
+        parser.add_argument('--warm', action='store_true')
 
     def handle(self, *args, **options):
-        """-Delete all the products from the database.
+        """-Delete all the products from the database,
+        unless the catalog is swapped.
         -Diplay the number of products deleted.
         -Download and insert the products in the database.
-        -Display the number of products inserted."""
+        -Display the number of products inserted and the throughput.
+        -Search the popular queries again in the new catalog.
+        A resumed import doesn't delete the products"""
+        if options['warm'] and not shared_results():
+            raise CommandError(LOCAL_CACHE_ERROR)
+        if options['offline'] and not options['cache_dir']:
+            raise CommandError('--offline needs an --http-cache directory')
+        if options['workers'] > 1:
+            if options['resume']:
+                raise CommandError("An import with --workers can't be resumed")
+            if options['swap']:
+                raise CommandError("--swap can't be used with --workers")
+        fill_db = FillDB(
+            nb_products=options['n_products'],
+            concurrency=options['concurrency'],
+            cache_dir=options['cache_dir'], offline=options['offline'],
+            workers=options['workers'])
+        if options['resume']:
+            if options['swap']:
+                raise CommandError("An import with --swap can't be resumed")
+            fill_db.checkpoint = ImportCheckpoint.unfinished(COMMAND)
+            if fill_db.checkpoint is None:
+                raise CommandError('No unfinished import to resume')
+            fill_db.nb_products = fill_db.checkpoint.nb_products
+            self.stdout.write(
+                f'Resuming the import after '
+                f'{fill_db.checkpoint.offset} products')
+            stats = fill_db.insert_products()
+        elif options['swap']:
+            stats = fill_db.rebuild_products()
+        else:
+            stats = self.delete_and_insert(fill_db)
+        count = Product.objects.count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully insered {count} products in the database'))
+        self.stdout.write(
+            f'{stats.downloaded} products downloaded, '
+            f'{stats.rejected} rejected, '
+            f'{stats.rate:.0f} products/s')
+        #  the popular queries were searched in the previous catalog
+        call_command(
+            'aggregate_queries', stdout=self.stdout, stderr=self.stderr)
+        if options['warm']:
+            call_command('warm_cache', stdout=self.stdout, stderr=self.stderr)
+
+    def delete_and_insert(self, fill_db):
+        """Delete all the products, then insert the downloaded products"""
         old_count = Product.objects.count()
         Product.objects.all().delete()
         count = Product.objects.count()
@@ -27,8 +99,6 @@ class Command(BaseCommand):
         else:
             self.stdout.write(self.style.SUCCESS(
                 f'{count} products still in the database'))
-        fill_db = FillDB(nb_products=options['n_products'])
-        fill_db.insert_products()
-        count = Product.objects.count()
-        self.stdout.write(self.style.SUCCESS(
-            f'Successfully insered {count} products in the database'))
\ No newline at end of file
+        fill_db.checkpoint = ImportCheckpoint.start(
+            COMMAND, fill_db.nb_products, initial_count=0)
+        return fill_db.insert_products()
@@ -1,18 +1,73 @@
+from django.core.management import call_command
 from django.core.management.base import BaseCommand, CommandError
 
+from substitut_search.utils.downloader import CONCURRENCY
 from substitut_search.utils.fill_db import FillDB
-from substitut_search.models import Product
+from substitut_search.utils.warmup import LOCAL_CACHE_ERROR, shared_results
+from substitut_search.models import ImportCheckpoint, Product
+
+#  Name of the checkpoints saved by this command
+COMMAND = 'update_db'
 
 class Command(BaseCommand):
     """Add the command to update the database by dowloading
     the products on OpenFoodFacts.org"""
     help = 'Update the products in the database'
 
+    def add_arguments(self, parser):
+        """Add optional arguments
+        --concurrency: the number of pages downloaded at the same time
+        --workers: the number of processes downloading, parsing and writing
+        the pages, sharing the rate limit of OpenFoodFacts. The workers
+        don't save checkpoints
+        --http-cache: a directory where the downloaded pages are recorded,
+        and replayed during the next imports
+        --offline: only use the pages recorded in the --http-cache directory
+        --resume: continue the last update, after its last checkpoint
+        --warm: fill the results cache once the products are updated"""
+        parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--http-cache', dest='cache_dir')
+        parser.add_argument('--offline', action='store_true')
+        parser.add_argument('--resume', action='store_true')
+        parser.add_argument('--warm', action='store_true')
+
     def handle(self, *args, **options):
         """Update the database by dowloading
-        the products on OpenFoodFacts.org"""
-        count = Product.objects.count()
-        fill_db = FillDB(nb_products=int(count*1.3))
-        fill_db.update_products()
+        the products on OpenFoodFacts.org, then search
+        the popular queries again in the updated catalog"""
+        if options['warm'] and not shared_results():
+            raise CommandError(LOCAL_CACHE_ERROR)
+        if options['offline'] and not options['cache_dir']:
+            raise CommandError('--offline needs an --http-cache directory')
+        if options['resume'] and options['workers'] > 1:
+            raise CommandError("An update with --workers can't be resumed")
+        if options['resume']:
+            checkpoint = ImportCheckpoint.unfinished(COMMAND)
+            if checkpoint is None:
+                raise CommandError('No unfinished update to resume')
+            self.stdout.write(
+                f'Resuming the update after {checkpoint.offset} products')
+        else:
+            count = Product.objects.count()
+            checkpoint = ImportCheckpoint.start(
+                COMMAND, int(count*1.3), initial_count=count)
+        fill_db = FillDB(
+            nb_products=checkpoint.nb_products,
+            concurrency=options['concurrency'], checkpoint=checkpoint,
+            cache_dir=options['cache_dir'], offline=options['offline'],
+            workers=options['workers'])
+        stats = fill_db.update_products()
         message = f'Successfully updated the database'
         self.stdout.write(self.style.SUCCESS(message))
+        self.stdout.write(
+            f'{stats.updated} products updated, '
+            f'{stats.inserted} inserted, '
+            f'{stats.unchanged} unchanged, '
+            f'{stats.rejected} rejected, '
+            f'{stats.rate:.0f} products/s')
+        #  the popular queries were searched in the previous catalog
+        call_command(
+            'aggregate_queries', stdout=self.stdout, stderr=self.stderr)
+        if options['warm']:
+            call_command('warm_cache', stdout=self.stdout, stderr=self.stderr)
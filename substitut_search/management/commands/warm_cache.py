@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+import numpy as np
+
+from substitut_search import views
+from substitut_search.utils.queries import search_logger
+from substitut_search.utils.warmup import (
+    LOCAL_CACHE_ERROR, NB_PRODUCTS, NB_QUERIES, WORKERS, shared_results,
+    top_products, top_queries, warm_pages)
+
+
+class Command(BaseCommand):
+    """Add the command to fill the results cache after an import"""
+    help = ('Compute and cache the substitutes and the informations '
+            'of the most saved products, and the results of searches')
+
+    def add_arguments(self, parser):
+        """Add optional arguments
+        --products: the number of products warmed
+        --queries: the searches replayed, by default the popular queries
+        --workers: the number of pages requested at the same time.
+        The setting RESULTS_CACHE must be a shared cache,
+        so the web workers read the warmed results"""
+        parser.add_argument('--products', type=int, default=NB_PRODUCTS)
+        parser.add_argument('--queries', nargs='*')
+        parser.add_argument('--workers', type=int, default=WORKERS)
+
+    def handle(self, *args, **options):
+        """Request the pages of the products and the searches,
+        then display the number of pages and their time for each view"""
+        if not shared_results():
+            raise CommandError(LOCAL_CACHE_ERROR)
+        pages = []
+        for code in top_products(options['products']):
+            pages.append(('find', views.find, {'product_id': code}))
+            pages.append(('detail', views.detail, {'product_id': code}))
+        queries = options['queries']
+        if queries is None:
+            queries = top_queries(NB_QUERIES)
+        for query in queries:
+            pages.append(('search', views.search, {'query': query}))
+        start = time.perf_counter()
+        #  the replayed searches aren't searches of the users
+        search_logger.enabled = False
+        try:
+            durations = warm_pages(pages, options['workers'])
+        finally:
+            search_logger.enabled = True
+        for name, times in durations.items():
+            self.stdout.write(
+                f'{name}: {len(times)} pages, '
+                f'mean {np.mean(times)*1000:.1f} ms, '
+                f'p99 {np.percentile(times, 99)*1000:.1f} ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully warmed {len(pages)} pages '
+            f'in {time.perf_counter() - start:.1f} s'))
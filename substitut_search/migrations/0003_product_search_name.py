@@ -0,0 +1,46 @@
+# Generated by Django 3.0.3 on 2026-10-18 14:17
+
+import unicodedata
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+def normalize(text):
+    """Lowercase a text and strip its accents, like the 'normalize'
+    of the app did when this migration was written"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return stripped.lower()
+
+
+def fill_search_name(apps, schema_editor):
+    """Fill the normalized name of the products already in the database"""
+    Product = apps.get_model('substitut_search', 'Product')
+    products = []
+    for product in Product.objects.only('code', 'name').iterator():
+        product.search_name = normalize(product.name)
+        products.append(product)
+    Product.objects.bulk_update(products, ['search_name'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('substitut_search', '0002_favory_tag'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_name',
+            field=models.CharField(default='', max_length=200),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_name'], name='product_search_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
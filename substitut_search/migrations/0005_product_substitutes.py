@@ -0,0 +1,32 @@
+# Generated by Django 3.0.3 on 2026-10-18 14:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('substitut_search', '0004_catalog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='substitutes_stale',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.CreateModel(
+            name='ProductSubstitute',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='substitute_links', to='substitut_search.Product')),
+                ('substitute', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='substituted_links', to='substitut_search.Product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='productsubstitute',
+            constraint=models.UniqueConstraint(fields=('product', 'rank'), name='unique_substitute_rank'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.3 on 2026-10-18 14:21
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('substitut_search', '0005_product_substitutes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['categories'], name='product_categories_gin'),
+        ),
+    ]
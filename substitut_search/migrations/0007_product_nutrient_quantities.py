@@ -0,0 +1,59 @@
+# Generated by Django 3.0.3 on 2026-10-18 14:23
+
+import re
+
+from django.db import migrations, models
+
+#  the sentences built by 'get_nutrients', like "Sel en quantitée faible (1g)"
+SENTENCE = re.compile(r"^(.+) en quantitée .+ \(([0-9.]+)g\)$")
+FIELDS = {
+    'Matières grasses': 'fat_100g',
+    'Acides gras saturés': 'saturated_fat_100g',
+    'Sucres': 'sugars_100g',
+    'Sel': 'salt_100g'}
+
+
+def fill_quantities(apps, schema_editor):
+    """Read the quantities in the nutrient levels of the products
+    already in the database"""
+    Product = apps.get_model('substitut_search', 'Product')
+    products = []
+    for product in Product.objects.only('code', 'nutrient_levels').iterator():
+        for sentence in product.nutrient_levels:
+            match = SENTENCE.match(sentence)
+            if match and match.group(1) in FIELDS:
+                setattr(product, FIELDS[match.group(1)], float(match.group(2)))
+        products.append(product)
+    Product.objects.bulk_update(
+        products, list(FIELDS.values()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('substitut_search', '0006_product_categories_gin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='fat_100g',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='salt_100g',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='saturated_fat_100g',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sugars_100g',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_quantities, migrations.RunPython.noop),
+    ]
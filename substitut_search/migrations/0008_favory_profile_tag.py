@@ -0,0 +1,24 @@
+# Generated by Django 3.0.3 on 2026-10-18 14:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_auto_20200409_1851'),
+        ('substitut_search', '0007_product_nutrient_quantities'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='favory',
+            name='user_profile',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='accounts.Profile'),
+        ),
+        migrations.AddIndex(
+            model_name='favory',
+            index=models.Index(fields=['user_profile', 'tag'], name='favory_profile_tag'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.0.3 on 2026-10-18 14:32
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+#  the fields hashed by 'parse_product' when this migration was written
+HASHED_FIELDS = [
+    'nutriscore', 'categories', 'name', 'link', 'image', 'nutrient_levels',
+    'fat_100g', 'saturated_fat_100g', 'sugars_100g', 'salt_100g']
+
+
+def content_hash(values):
+    """The hash of 'substitut_search.utils.hashing' when this migration
+    was written, so the stored hashes don't depend on its later versions"""
+    serialized = json.dumps(values, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.md5(serialized.encode('utf-8')).hexdigest()
+
+
+def fill_content_hash(apps, schema_editor):
+    """Hash the products already in the database"""
+    Product = apps.get_model('substitut_search', 'Product')
+    products = []
+    for product in Product.objects.only('code', *HASHED_FIELDS).iterator():
+        product.content_hash = content_hash(
+            [getattr(product, field) for field in HASHED_FIELDS])
+        products.append(product)
+    Product.objects.bulk_update(products, ['content_hash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('substitut_search', '0008_favory_profile_tag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='content_hash',
+            field=models.CharField(default='', max_length=32),
+        ),
+        migrations.RunPython(fill_content_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 3.0.3 on 2026-10-18 14:39
+
+import hashlib
+import json
+import re
+
+from django.db import migrations, models
+
+#  the sentences built by 'get_nutrients', like "Sel en quantitée faible (1g)"
+SENTENCE = re.compile(r"^(.+) en quantitée (.+) \(([0-9.]+)g\)$")
+FIELDS = {
+    'Matières grasses': 'fat_level',
+    'Acides gras saturés': 'saturated_fat_level',
+    'Sucres': 'sugars_level',
+    'Sel': 'salt_level'}
+LEVELS = {'faible': 0, 'modérée': 1, 'élevée': 2}
+#  the fields hashed by 'parse_product' when this migration was written
+HASHED_FIELDS = [
+    'nutriscore', 'categories', 'name', 'link', 'image',
+    'fat_level', 'saturated_fat_level', 'sugars_level', 'salt_level',
+    'fat_100g', 'saturated_fat_100g', 'sugars_100g', 'salt_100g']
+BATCH_SIZE = 1000
+
+
+def content_hash(values):
+    """Hash of a list of values, as computed by 'parse_product'
+    when this migration was written"""
+    serialized = json.dumps(values, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.md5(serialized.encode('utf-8')).hexdigest()
+
+
+def fill_levels(apps, schema_editor):
+    """Read the levels in the nutrient sentences of the products
+    already in the database, and hash the products again.
+    The products are updated by batches of BATCH_SIZE"""
+    Product = apps.get_model('substitut_search', 'Product')
+    products = []
+    for product in Product.objects.only(
+            'code', 'nutrient_levels', *HASHED_FIELDS).iterator(BATCH_SIZE):
+        for sentence in product.nutrient_levels:
+            match = SENTENCE.match(sentence)
+            if match and match.group(1) in FIELDS:
+                setattr(product, FIELDS[match.group(1)],
+                        LEVELS.get(match.group(2)))
+        product.content_hash = content_hash(
+            [getattr(product, field) for field in HASHED_FIELDS])
+        products.append(product)
+        if len(products) == BATCH_SIZE:
+            Product.objects.bulk_update(
+                products, [*FIELDS.values(), 'content_hash'])
+            products = []
+    Product.objects.bulk_update(products, [*FIELDS.values(), 'content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('substitut_search', '0010_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='fat_level',
+            field=models.PositiveSmallIntegerField(blank=True, choices=[(0, 'faible'), (1, 'modérée'), (2, 'élevée')], db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='salt_level',
+            field=models.PositiveSmallIntegerField(blank=True, choices=[(0, 'faible'), (1, 'modérée'), (2, 'élevée')], db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='saturated_fat_level',
+            field=models.PositiveSmallIntegerField(blank=True, choices=[(0, 'faible'), (1, 'modérée'), (2, 'élevée')], db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sugars_level',
+            field=models.PositiveSmallIntegerField(blank=True, choices=[(0, 'faible'), (1, 'modérée'), (2, 'élevée')], db_index=True, null=True),
+        ),
+        migrations.RunPython(fill_levels, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='product',
+            name='nutrient_levels',
+        ),
+    ]
@@ -1,5 +1,10 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+
+from .signals import catalog_updated
+from .utils.text import normalize
 
 
 class Product(models.Model):
@@ -10,21 +15,199 @@ class Product(models.Model):
         max_length=1, choices=ns_choices, db_index=True)
     categories = ArrayField(models.CharField(max_length=100))
     name = models.CharField(max_length=200, unique=True)
+    #  the name without case and accents, indexed for the trigram search
+    search_name = models.CharField(max_length=200, default="")
     image = models.URLField()
     link = models.URLField(unique=True)
-    nutrient_levels = ArrayField(models.CharField(max_length=80), default=list)
+    #  levels of nutrients per 100g, given by OpenFoodFacts
+    level_choices = [(0, "faible"), (1, "modérée"), (2, "élevée")]
+    fat_level = models.PositiveSmallIntegerField(
+        choices=level_choices, null=True, blank=True, db_index=True)
+    saturated_fat_level = models.PositiveSmallIntegerField(
+        choices=level_choices, null=True, blank=True, db_index=True)
+    sugars_level = models.PositiveSmallIntegerField(
+        choices=level_choices, null=True, blank=True, db_index=True)
+    salt_level = models.PositiveSmallIntegerField(
+        choices=level_choices, null=True, blank=True, db_index=True)
+    #  quantities of nutrients per 100g, to compare the products
+    fat_100g = models.FloatField(null=True, blank=True)
+    saturated_fat_100g = models.FloatField(null=True, blank=True)
+    sugars_100g = models.FloatField(null=True, blank=True)
+    salt_100g = models.FloatField(null=True, blank=True)
+    #  the displayed name, level field and quantity field of the nutrients
+    nutrients = [
+        ("Matières grasses", 'fat_level', 'fat_100g'),
+        ("Acides gras saturés", 'saturated_fat_level', 'saturated_fat_100g'),
+        ("Sucres", 'sugars_level', 'sugars_100g'),
+        ("Sel", 'salt_level', 'salt_100g')]
+    #  hash of the downloaded fields, to skip the unchanged products
+    #  during the updates
+    content_hash = models.CharField(max_length=32, default="")
+    #  True until the substitutes of the product are precomputed,
+    #  and again when its categories or its nutriscore change
+    substitutes_stale = models.BooleanField(default=True)
+    #  time of the import which inserted or last changed the product,
+    #  to answer the conditional requests of its pages
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['categories'], name='product_categories_gin'),
+            GinIndex(
+                fields=['search_name'],
+                name='product_search_name_trgm',
+                opclasses=['gin_trgm_ops']),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize(self.name)
+        super().save(*args, **kwargs)
+
+    def nutrient_labels(self):
+        """Describe the level and quantity of each known nutrient,
+        like "Sucres en quantitée faible (0.5g)" """
+        labels = []
+        for name, level_field, quantity_field in self.nutrients:
+            quantity = getattr(self, quantity_field)
+            if getattr(self, level_field) is None or quantity is None:
+                continue
+            level = getattr(self, f'get_{level_field}_display')()
+            labels.append(f"{name} en quantitée {level} ({quantity:g}g)")
+        return labels
+
+
+class ProductSubstitute(models.Model):
+    """Substitutes of a product, precomputed after the imports.
+    The rank starts at 0 for the best substitute"""
+    #  the unique constraint on (product, rank) already indexes 'product'
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, db_index=False,
+        related_name='substitute_links')
+    substitute = models.ForeignKey(
+        Product, on_delete=models.CASCADE,
+        related_name='substituted_links')
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'rank'], name='unique_substitute_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.substitute_id}"
+
 
 class Favory(models.Model):
     """Relation table between Product and User"""
+    #  the index on (user_profile, tag) already indexes 'user_profile'
     user_profile = models.ForeignKey(
-        'accounts.Profile', on_delete=models.CASCADE)
+        'accounts.Profile', on_delete=models.CASCADE, db_index=False)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     saved_at = models.DateTimeField(auto_now_add=True)
     tag = models.CharField(max_length=200, default="Non classé")
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user_profile', 'tag'], name='favory_profile_tag'),
+        ]
+
     def __str__(self):
         return self.product.name
+
+
+class Catalog(models.Model):
+    """Single row storing the generation of the products catalog.
+    The generation is incremented after each import, so the structures
+    built from the products know when they have to be rebuilt"""
+    generation = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def current_generation(cls):
+        """Return the current generation, 0 if nothing was imported yet"""
+        generation = cls.objects.values_list('generation', flat=True).first()
+        return generation or 0
+
+    @classmethod
+    def bump(cls):
+        """Increment the generation and send the signal 'catalog_updated'"""
+        with transaction.atomic():
+            catalog, _ = cls.objects.select_for_update().get_or_create(pk=1)
+            catalog.generation += 1
+            catalog.save()
+        catalog_updated.send(sender=cls, generation=catalog.generation)
+        return catalog.generation
+
+
+class ImportCheckpoint(models.Model):
+    """Progress of the last import run by a command, saved with each batch
+    of products written, so a failed import can be resumed.
+    'offset' is the number of downloaded products already written"""
+    command = models.CharField(max_length=50, unique=True)
+    nb_products = models.PositiveIntegerField()
+    #  number of products in the database before the import
+    initial_count = models.PositiveIntegerField(default=0)
+    offset = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    finished = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def unfinished(cls, command):
+        """Return the checkpoint of the unfinished import of a command,
+        or None if its last import finished"""
+        return cls.objects.filter(command=command, finished=False).first()
+
+    @classmethod
+    def start(cls, command, nb_products, initial_count):
+        """Return a new checkpoint for an import, replacing the last one"""
+        checkpoint, _ = cls.objects.update_or_create(
+            command=command,
+            defaults={
+                'nb_products': nb_products, 'initial_count': initial_count,
+                'offset': 0, 'rejected': 0, 'updated': 0, 'unchanged': 0,
+                'failures': 0, 'last_error': "", 'finished': False})
+        return checkpoint
+
+    def record(self, stats):
+        """Save the progress of the import, from its ImportStats"""
+        self.offset = stats.downloaded
+        self.rejected = stats.rejected
+        self.updated = stats.updated
+        self.unchanged = stats.unchanged
+        self.save()
+
+    def fail(self, error):
+        """Save the error which stopped the import"""
+        self.failures += 1
+        self.last_error = repr(error)
+        self.save(update_fields=['failures', 'last_error', 'updated_at'])
+
+
+class SearchLog(models.Model):
+    """Number of searches of a normalized query, counted in memory
+    by a process, then written with the other queries at once"""
+    query = models.CharField(max_length=200)
+    count = models.PositiveIntegerField(default=1)
+    logged_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class PopularQuery(models.Model):
+    """One of the most searched queries, aggregated from the SearchLog,
+    with the codes of the products it finds in the catalog 'generation'"""
+    query = models.CharField(max_length=200, unique=True)
+    count = models.PositiveIntegerField()
+    products = ArrayField(models.CharField(max_length=50), default=list)
+    generation = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.query
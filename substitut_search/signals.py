@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+#  Sent by Catalog.bump, after an import changed the products
+catalog_updated = Signal(providing_args=['generation'])
+
+
+@receiver(post_save, sender='substitut_search.Favory')
+@receiver(post_delete, sender='substitut_search.Favory')
+def invalidate_favory_tags(sender, instance, **kwargs):
+    """Each time a favory is saved or deleted,
+    make the cached tags of its user stale"""
+    from .utils.favories import invalidate_tags
+    invalidate_tags([instance.user_profile_id])
@@ -1,12 +1,45 @@
-from unittest.mock import Mock
+import gzip
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest.mock import Mock, patch
 from unittest import skip
+from urllib.parse import parse_qs, urlparse
 
-from django.test import TestCase
+import requests
 
-from ..models import Product
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from ..models import (
+    Catalog, Favory, ImportCheckpoint, PopularQuery, Product,
+    SearchLog)
+from ..utils.autocomplete import prefix_index
+from ..utils.category_index import load_category_index
+from ..utils.downloader import PageDownloader, PageNotCached
+from ..utils.dump import DumpImporter, from_json
 from ..utils.fill_db import FillDB
+from ..utils.results import (
+    catalog_generation, detail_results, find_results, search_results)
+from ..utils.substitutes import (
+    NB_SUBSTITUTES, SubstitutesComputer, find_substitutes,
+    search_substitutes)
+from ..views import NB_DISPLAYED_PRODUCTS
 
 nutrients = ['fat', 'saturated-fat', 'sugars', 'salt']
+#  A results cache shared by the processes, which can be warmed
+shared_results = override_settings(
+    CACHES={**settings.CACHES, 'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'results_tests')}},
+    RESULTS_CACHE='shared')
 
 class TestFillDB(TestCase):
     MOCK_PRODUCTS = [
@@ -37,9 +70,110 @@ class TestFillDB(TestCase):
         fill_db.insert_products()
         fill_db.dl_products.assert_called_once()
         self.assertQuerysetEqual(
-            list(Product.objects.all()),
+            list(Product.objects.order_by('name')),
             ['<Product: Test1>', '<Product: Test2>'])
 
+    # test the quantities of nutrients are saved as numbers
+    def test_insert_quantities(self):
+        fill_db = FillDB()
+        fill_db.dl_products = Mock(return_value=self.MOCK_PRODUCTS)
+        fill_db.insert_products()
+        product = Product.objects.get(name="Test1")
+        self.assertEqual(product.sugars_100g, 2.0)
+        self.assertEqual(product.sugars_level, 0)
+        self.assertIsNone(Product.objects.get(name="Test2").salt_level)
+        self.assertIsNone(Product.objects.get(name="Test2").salt_100g)
+
+    # test the products are written while the next ones are downloaded
+    @patch('substitut_search.utils.fill_db.BATCH_SIZE', 1)
+    def test_insert_products_streamed(self):
+        counts = []
+        def dl_products(offset=0):
+            for product in self.MOCK_PRODUCTS:
+                counts.append(Product.objects.count())
+                yield product
+        fill_db = FillDB()
+        fill_db.dl_products = dl_products
+        fill_db.insert_products()
+        self.assertEqual(counts, [0, 1])
+
+    # test a failed import is resumed after the products written
+    @patch('substitut_search.utils.fill_db.BATCH_SIZE', 1)
+    def test_insert_products_resumed(self):
+        def failing_dl_products(offset=0):
+            yield self.MOCK_PRODUCTS[0]
+            raise ConnectionError("network down")
+        checkpoint = ImportCheckpoint.start(
+            "init_products_db", 2, initial_count=0)
+        fill_db = FillDB(checkpoint=checkpoint)
+        fill_db.dl_products = failing_dl_products
+        with self.assertRaises(ConnectionError):
+            fill_db.insert_products()
+        checkpoint = ImportCheckpoint.unfinished("init_products_db")
+        self.assertEqual((checkpoint.offset, checkpoint.failures), (1, 1))
+        self.assertIn("network down", checkpoint.last_error)
+        fill_db = FillDB(checkpoint=checkpoint)
+        fill_db.dl_products = Mock(return_value=self.MOCK_PRODUCTS[1:])
+        stats = fill_db.insert_products()
+        fill_db.dl_products.assert_called_once_with(1)
+        self.assertEqual((stats.downloaded, stats.inserted), (2, 2))
+        self.assertIsNone(ImportCheckpoint.unfinished("init_products_db"))
+
+    # test the download of a resumed import starts at the checkpoint
+    @patch('substitut_search.utils.fill_db.PAGE_SIZE', 10)
+    @patch('substitut_search.utils.downloader.PAGE_SIZE', 10)
+    def test_dl_products_offset(self):
+        fill_db = FillDB(nb_products=30)
+        def get_page(page, page_size):
+            return [f"{page}-{number}" for number in range(page_size)]
+        with patch.object(fill_db.downloader, 'get_page', side_effect=get_page):
+            products = list(fill_db.dl_products(offset=13))
+        self.assertEqual(len(products), 17)
+        self.assertEqual(products[0], "2-3")
+
+    # test an import can't be resumed without checkpoint
+    def test_resume_without_checkpoint(self):
+        with self.assertRaises(CommandError):
+            call_command('init_products_db', '10', '--resume')
+
+    # test the imports with workers can't be resumed or swapped
+    def test_workers_options(self):
+        for command, options in [
+                ('init_products_db', ['10', '--resume']),
+                ('init_products_db', ['10', '--swap']),
+                ('update_db', ['--resume'])]:
+            with self.assertRaises(CommandError):
+                call_command(command, *options, '--workers', '2')
+
+    # test the invalid and conflicting products are not inserted
+    def test_insert_invalid_products(self):
+        invalid = [
+            dict(self.MOCK_PRODUCTS[0], code="1", nutrition_grade_fr="x"),
+            dict(self.MOCK_PRODUCTS[0], code="2", product_name="t" * 201),
+            dict(self.MOCK_PRODUCTS[0], code="3", url="https//test3.com"),
+        ]
+        fill_db = FillDB()
+        fill_db.dl_products = Mock(return_value=self.MOCK_PRODUCTS + invalid)
+        stats = fill_db.insert_products()
+        self.assertEqual(
+            (stats.downloaded, stats.rejected, stats.inserted), (5, 2, 2))
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertEqual(
+            Product.objects.get(name="Test1").search_name, "test1")
+
+    # test the import increments the catalog generation
+    # and rebuilds the autocomplete index
+    def test_insert_products_bump_generation(self):
+        prefix_index.invalidate()
+        self.assertEqual(len(prefix_index.get()), 0)
+        fill_db = FillDB()
+        fill_db.dl_products = Mock(return_value=self.MOCK_PRODUCTS)
+        fill_db.insert_products()
+        self.assertEqual(Catalog.current_generation(), 1)
+        self.assertEqual(
+            [product["name"] for product in prefix_index.lookup("te", 8)],
+            ["Test1", "Test2"])
+
     # test download and insert products
     @skip("very long test using API call")
     def test_insert_products_no_mock(self):
@@ -48,6 +182,89 @@ class TestFillDB(TestCase):
         fill_db.insert_products()
         self.assertGreater(Product.objects.count(), 200)
 
+class StubOpenFoodFacts(BaseHTTPRequestHandler):
+    """Serve pages of fake products, failing once on the second page"""
+    failed = False
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        page = int(query["page"][0])
+        if page == 2 and not StubOpenFoodFacts.failed:
+            StubOpenFoodFacts.failed = True
+            self.send_response(503)
+            self.end_headers()
+            return
+        products = [{"code": f"{page}-{number}"}
+                    for number in range(int(query["page_size"][0]))]
+        body = json.dumps({"products": products}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDownloader(TestCase):
+
+    def setUp(self):
+        StubOpenFoodFacts.failed = False
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenFoodFacts)
+        threading.Thread(target=self.server.serve_forever).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/search"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # test the pages are downloaded concurrently, retried and kept in order
+    @patch('substitut_search.utils.downloader.PAGE_SIZE', 10)
+    def test_download_pages(self):
+        downloader = PageDownloader(
+            concurrency=3, rate=None, backoff=0, url=self.url)
+        pages = list(downloader.pages(25))
+        self.assertTrue(StubOpenFoodFacts.failed)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([page[0]["code"] for page in pages],
+                         ["1-0", "2-0", "3-0"])
+
+    # test the pages are not downloaded far ahead of the used page
+    def test_download_pages_bounded(self):
+        downloader = PageDownloader(concurrency=2, rate=None, url=self.url)
+        requested = []
+        def get_page(page, page_size):
+            requested.append(page)
+            return [page]
+        with patch.object(downloader, 'get_page', side_effect=get_page):
+            pages = downloader.pages(10000)
+            self.assertEqual(next(pages), [1])
+            self.assertLessEqual(len(requested), 3)
+            self.assertEqual(list(pages), [[page] for page in range(2, 11)])
+
+    # test the recorded pages are replayed without the network
+    @patch('substitut_search.utils.downloader.PAGE_SIZE', 10)
+    def test_record_and_replay_pages(self):
+        with tempfile.TemporaryDirectory() as directory:
+            recorder = PageDownloader(
+                rate=None, backoff=0, url=self.url, cache_dir=directory)
+            recorded = list(recorder.pages(15))
+            self.assertEqual(len(os.listdir(directory)), 2)
+            self.server.shutdown()
+            replayer = PageDownloader(
+                url=self.url, cache_dir=directory, offline=True)
+            self.assertEqual(list(replayer.pages(15)), recorded)
+            with self.assertRaises(PageNotCached):
+                list(replayer.pages(25))
+
+    # test a request failing more than the retries raises the error
+    def test_download_retries_exhausted(self):
+        downloader = PageDownloader(rate=None, retries=0, url=self.url)
+        with self.assertRaises(requests.HTTPError):
+            downloader.get_page(2, 10)
+
+
 class TestUpdateDB(TestCase):
     fixtures = ['2products']
     MOCK_PRODUCTS = [
@@ -82,5 +299,378 @@ class TestUpdateDB(TestCase):
         fill_db.update_products()
         fill_db.dl_products.assert_called_once()
         self.assertQuerysetEqual(
-            list(Product.objects.all()),
+            list(Product.objects.order_by('name')),
             ['<Product: Test One>', '<Product: Test Two>'])
+
+    # test the unchanged products are skipped and the new ones inserted
+    def test_update_changed_products(self):
+        fill_db = FillDB()
+        fill_db.dl_products = Mock(return_value=self.MOCK_PRODUCTS)
+        fill_db.update_products()
+        Product.objects.update(substitutes_stale=False)
+        updated_at = dict(Product.objects.values_list('code', 'updated_at'))
+        new_product = dict(
+            self.MOCK_PRODUCTS[0], code="999", product_name="test three",
+            url="https//test3.com")
+        changed_product = dict(self.MOCK_PRODUCTS[1], nutrition_grade_fr="c")
+        fill_db.dl_products = Mock(return_value=[
+            self.MOCK_PRODUCTS[0], changed_product, new_product])
+        stats = fill_db.update_products()
+        self.assertEqual(
+            (stats.unchanged, stats.updated, stats.inserted), (1, 1, 1))
+        self.assertEqual(Product.objects.get(code="459562").nutriscore, "c")
+        self.assertTrue(Product.objects.filter(name="Test Three").exists())
+        self.assertEqual(
+            Product.objects.get(code="246825").updated_at,
+            updated_at["246825"])
+        self.assertGreater(
+            Product.objects.get(code="459562").updated_at,
+            updated_at["459562"])
+
+    # test a product taking the name of another one is skipped
+    def test_update_conflicting_product(self):
+        conflicting = dict(self.MOCK_PRODUCTS[1], product_name="test one")
+        fill_db = FillDB()
+        fill_db.dl_products = Mock(
+            return_value=[self.MOCK_PRODUCTS[0], conflicting])
+        with patch('builtins.print'):
+            stats = fill_db.update_products()
+        self.assertEqual(stats.updated, 1)
+        self.assertEqual(Product.objects.get(code="459562").name, "test2")
+
+
+class TestRebuildDB(TestCase):
+    fixtures = ['2products']
+
+    def setUp(self):
+        profile = User.objects.create_user(
+            username="test_user", password="test_user_password").profile
+        self.conflicting = Product.objects.create(
+            code="555", nutriscore="c", categories=["en:test"],
+            name="Conflict", link="https//conflict.com",
+            image="https//conflict.com")
+        Product.objects.create(
+            code="556", nutriscore="c", categories=["en:test"],
+            name="Not saved", link="https//notsaved.com",
+            image="https//notsaved.com")
+        for code in ["246825", "459562", "555"]:
+            Favory.objects.create(
+                user_profile=profile, product=Product.objects.get(code=code))
+        self.products = [
+            dict(TestUpdateDB.MOCK_PRODUCTS[0], url="https//new1.com"),
+            dict(TestUpdateDB.MOCK_PRODUCTS[0], code="777",
+                 product_name="new product", url="https//new2.com"),
+            dict(TestUpdateDB.MOCK_PRODUCTS[0], code="888",
+                 product_name="conflict", url="https//new3.com"),
+        ]
+
+    # test the catalog is replaced, keeping the saved products
+    def test_rebuild_products(self):
+        fill_db = FillDB()
+        fill_db.dl_products = Mock(return_value=self.products)
+        stats = fill_db.rebuild_products()
+        self.assertEqual(stats.inserted, 3)
+        self.assertEqual(
+            set(Product.objects.values_list('code', flat=True)),
+            {"246825", "459562", "777", "888"})
+        self.assertEqual(Product.objects.get(code="246825").name, "Test One")
+        self.assertEqual(
+            set(Favory.objects.values_list('product', flat=True)),
+            {"246825", "459562"})
+        self.assertFalse(
+            Product.objects.filter(substitutes_stale=True).exists())
+        self.assertEqual(Catalog.current_generation(), 1)
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW search_path")
+            self.assertNotIn("staging", cursor.fetchone()[0])
+        # the favories reference the new catalog
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Favory.objects.create(
+                user_profile=Favory.objects.first().user_profile,
+                product_id="556")
+            connection.check_constraints()
+
+    # test a saved product whose name conflicts with a product
+    # of the new catalog is dropped, with its favories
+    def test_rebuild_saved_conflict(self):
+        fill_db = FillDB()
+        fill_db.dl_products = Mock(return_value=self.products)
+        fill_db.rebuild_products()
+        self.assertEqual(Product.objects.get(code="888").name, "Conflict")
+        self.assertFalse(
+            Product.objects.filter(pk=self.conflicting.pk).exists())
+        self.assertFalse(
+            Favory.objects.filter(product_id=self.conflicting.pk).exists())
+
+    # test a failed rebuild leaves the live catalog untouched
+    def test_rebuild_products_failure(self):
+        fill_db = FillDB()
+        fill_db.dl_products = Mock(side_effect=ConnectionError)
+        with self.assertRaises(ConnectionError):
+            fill_db.rebuild_products()
+        self.assertEqual(Product.objects.count(), 4)
+        self.assertEqual(Favory.objects.count(), 3)
+
+
+def write_jsonl(directory, products):
+    """Write the products in a gzipped JSONL dump, with an invalid line"""
+    path = os.path.join(directory, "products.jsonl.gz")
+    with gzip.open(path, "wt") as dump:
+        for product in products:
+            dump.write(json.dumps(product) + "\n")
+        dump.write("not json\n")
+    return path
+
+
+class TestImportDump(TestCase):
+    PRODUCTS = [
+        {
+            "code": str(number),
+            "nutriscore_grade": "abcde"[number % 5],
+            "categories_tags": ["en:test", f"en:test-{number % 3}"],
+            "product_name": f"dump product {number}",
+            "image_front_small_url": f"https//test{number}.com",
+            "nutrient_levels": {e: "low" for e in nutrients},
+            "nutriments": {e+'_100g': number / 10 for e in nutrients}
+        } for number in range(30)]
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_jsonl(self):
+        return write_jsonl(self.directory.name, self.PRODUCTS)
+
+    # test the products of a gzipped JSONL dump are inserted
+    def test_import_jsonl(self):
+        out = StringIO()
+        call_command('import_dump', self.write_jsonl(), stdout=out)
+        self.assertEqual(Product.objects.count(), 30)
+        self.assertIn("31 products read, 1 rejected", out.getvalue())
+        product = Product.objects.get(code="7")
+        self.assertEqual(product.nutriscore, "c")
+        self.assertEqual(product.link, "https://fr.openfoodfacts.org/produit/7")
+        self.assertEqual(product.sugars_100g, 0.7)
+
+    # test the popular queries are searched again in the new catalog
+    def test_import_popular_queries(self):
+        SearchLog.objects.create(query="dump product 7", count=3)
+        call_command('aggregate_queries', stdout=StringIO())
+        call_command('import_dump', self.write_jsonl(), stdout=StringIO())
+        popular = PopularQuery.objects.get()
+        self.assertEqual(popular.generation, Catalog.current_generation())
+        self.assertEqual(popular.products[0], "7")
+
+    # test the products of a CSV dump are inserted, with their levels
+    def test_import_csv(self):
+        path = os.path.join(self.directory.name, "products.csv")
+        with open(path, "w") as dump:
+            dump.write("code\turl\tproduct_name\tcategories_tags\t"
+                       "nutriscore_grade\timage_small_url\tfat_100g\t"
+                       "sugars_100g\n")
+            dump.write("42\thttps//test.com\tcsv product\ten:a,en:b\t"
+                       "b\thttps//test.com\t20\t4.5\n")
+        progress = []
+        with patch('substitut_search.utils.dump.PROGRESS_INTERVAL', 1):
+            DumpImporter(path, progress=progress.append).insert_products()
+        self.assertEqual(len(progress), 1)
+        product = Product.objects.get(code="42")
+        self.assertEqual(product.categories, ["en:a", "en:b"])
+        self.assertEqual(
+            (product.fat_level, product.sugars_level, product.salt_level),
+            (2, 0, None))
+
+
+class TestParallelImport(TransactionTestCase):
+    PRODUCTS = TestImportDump.PRODUCTS
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # test the dump can be parsed and written by several processes
+    @patch('substitut_search.utils.dump.CHUNK_SIZE', 4)
+    def test_import_dump_workers(self):
+        out = StringIO()
+        call_command(
+            'import_dump', write_jsonl(self.directory.name, self.PRODUCTS),
+            '--workers', '2', stdout=out)
+        self.assertIn("31 products read, 1 rejected", out.getvalue())
+        self.assertEqual(
+            sorted(Product.objects.values_list('name', flat=True)),
+            sorted(product["product_name"].title()
+                   for product in self.PRODUCTS))
+
+    # test the pages can be downloaded and written by several processes
+    @patch('substitut_search.utils.downloader.PAGE_SIZE', 7)
+    @shared_results
+    def test_init_products_workers(self):
+        directory = self.directory.name
+        downloader = PageDownloader(cache_dir=directory, offline=True)
+        for page, size in enumerate(downloader.page_sizes(30), start=1):
+            products = [
+                from_json(dict(product))
+                for product in self.PRODUCTS[(page - 1) * 7:][:size]]
+            path = downloader.transport.path(
+                downloader.url, downloader.payload(page, size))
+            with gzip.open(path, "wt") as recorded:
+                json.dump({"products": products}, recorded)
+        out = StringIO()
+        call_command(
+            'init_products_db', '30', '--workers', '3', '--http-cache',
+            directory, '--offline', '--warm', stdout=out)
+        self.assertIn("30 products downloaded, 0 rejected", out.getvalue())
+        self.assertIn("Successfully warmed 60 pages", out.getvalue())
+        self.assertEqual(Product.objects.count(), 30)
+        self.assertFalse(
+            Product.objects.filter(substitutes_stale=True).exists())
+
+
+@shared_results
+class TestWarmCache(TransactionTestCase):
+    fixtures = ['19products']
+
+    def setUp(self):
+        catalog_generation.invalidate()
+        find_results.clear()
+        detail_results.clear()
+        search_results.clear()
+
+    # test the pages of the most saved products and the searches are cached
+    def test_warm_cache(self):
+        user = User.objects.create_user(username="warm_user")
+        product = Product.objects.order_by('-code')[0]
+        Favory.objects.create(user_profile=user.profile, product=product)
+        out = StringIO()
+        call_command(
+            'warm_cache', '--products', '3', '--queries', 'cookies', 'sablé',
+            '--workers', '2', stdout=out)
+        self.assertIn("find: 3 pages", out.getvalue())
+        self.assertIn("detail: 3 pages", out.getvalue())
+        self.assertIn("search: 2 pages", out.getvalue())
+        self.assertIn("Successfully warmed 8 pages", out.getvalue())
+        self.assertEqual(find_results.misses, 3)
+        self.assertIsNotNone(find_results.cache.get(
+            find_results.key(product.pk, NB_DISPLAYED_PRODUCTS, [])))
+        self.assertIsNotNone(detail_results.cache.get(
+            detail_results.key(product.pk)))
+        self.assertIsNotNone(search_results.cache.get(
+            search_results.key("cookies", NB_DISPLAYED_PRODUCTS)))
+
+
+class TestWarmLocalCache(TestCase):
+    fixtures = ['19products']
+
+    # test a local-memory results cache isn't warmed,
+    # and an import asked to warm it doesn't start
+    def test_warm_local_cache(self):
+        with self.assertRaisesMessage(CommandError, "local-memory"):
+            call_command('warm_cache', stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, "local-memory"):
+            call_command('init_products_db', '10', '--warm')
+        self.assertEqual(Product.objects.count(), 19)
+
+
+class TestAggregateQueries(TestCase):
+    fixtures = ['19products']
+
+    # test the most searched queries of the last days are kept,
+    # with their results
+    def test_aggregate_queries(self):
+        SearchLog.objects.bulk_create([
+            SearchLog(query="cookies", count=3),
+            SearchLog(query="cookies", count=2),
+            SearchLog(query="sable", count=4),
+            SearchLog(query="praline", count=1)])
+        old = SearchLog.objects.create(query="praline", count=10)
+        SearchLog.objects.filter(pk=old.pk).update(
+            logged_at=old.logged_at - timedelta(days=31))
+        out = StringIO()
+        call_command('aggregate_queries', '--count', '2', stdout=out)
+        self.assertIn("cookies: 5 searches", out.getvalue())
+        self.assertEqual(
+            list(PopularQuery.objects.order_by('-count')
+                 .values_list('query', 'count')),
+            [("cookies", 5), ("sable", 4)])
+        self.assertEqual(
+            [Product.objects.get(pk=code).name for code
+             in PopularQuery.objects.get(query="cookies").products],
+            ["Cookies coeur tendre", "Britt Cookies Guava"])
+        self.assertFalse(SearchLog.objects.filter(pk=old.pk).exists())
+
+
+class TestComputeSubstitutes(TestCase):
+    fixtures = ['19products']
+
+    # test the precomputed substitutes are the substitutes found by queries
+    def test_compute_all(self):
+        call_command('compute_substitutes', '--all', stdout=StringIO())
+        self.assertFalse(
+            Product.objects.filter(substitutes_stale=True).exists())
+        for product in Product.objects.all():
+            self.assertEqual(
+                find_substitutes(product, NB_SUBSTITUTES),
+                search_substitutes(product, NB_SUBSTITUTES))
+
+    # test only the products affected by a change are computed
+    def test_compute_incremental(self):
+        call_command('compute_substitutes', '--all', stdout=StringIO())
+        product = Product.objects.get(nutriscore="b")
+        Product.objects.filter(pk=product.pk).update(
+            nutriscore="e", substitutes_stale=True)
+        out = StringIO()
+        call_command('compute_substitutes', stdout=out)
+        # the product and the 17 products it was substituting
+        self.assertIn("18 products", out.getvalue())
+        for other in Product.objects.filter(nutriscore="c"):
+            self.assertNotIn(
+                product, find_substitutes(other, NB_SUBSTITUTES))
+
+    # test all the substitutes are computed when most products are stale,
+    # as after a full import
+    def test_compute_mostly_stale(self):
+        out = StringIO()
+        with patch.object(
+                SubstitutesComputer, 'affected_by') as affected_by:
+            call_command('compute_substitutes', stdout=out)
+        affected_by.assert_not_called()
+        self.assertIn("19 products", out.getvalue())
+
+    # test the index of the computation finds the same substitutes,
+    # without loading the names and images
+    def test_lean_index(self):
+        index = load_category_index()
+        lean = load_category_index(displayed=False)
+        self.assertEqual(set(lean.names), {""})
+        for code in index.codes:
+            self.assertEqual(
+                lean.find(code, NB_SUBSTITUTES),
+                index.find(code, NB_SUBSTITUTES))
+
+    # test the worse products are found once per category
+    def test_worse_products(self):
+        index = load_category_index()
+        products = list(Product.objects.all())
+        worse = set()
+        for product in products:
+            worse |= {
+                other.code for other in products
+                if other.nutriscore > product.nutriscore
+                and set(other.categories) & set(product.categories)}
+        self.assertEqual(
+            index.worse([product.code for product in products]), worse)
+
+    # test the benchmark times the ranking of generated candidates,
+    # then the search of both engines
+    def test_benchmark_ranking(self):
+        out = StringIO()
+        call_command(
+            'benchmark_ranking', '--sizes', '10000', '--products', '100',
+            '--repeat', '1', stdout=out)
+        self.assertIn("10000 candidates ranked in", out.getvalue())
+        self.assertIn("query: 19 products", out.getvalue())
+        self.assertIn("memory: 19 products", out.getvalue())
@@ -13,11 +13,12 @@ def create_product():
         "name": "test1",
         "image": "https//image_test.com",
         "link": "https//test.com",
-        "nutrient_levels": [
-            'Matières grasses en quantitée faible (0g)',
-            'Acides gras saturés en quantitée faible (0g)',
-            'Sucres en quantitée faible (0g)',
-            'Sel en quantitée faible (0.02794g)']
+        "fat_level": 0,
+        "fat_100g": 0,
+        "sugars_level": 2,
+        "sugars_100g": 25.5,
+        "salt_level": 0,
+        "salt_100g": 0.02794
         }
     return Product.objects.create(**product_info)
 
@@ -31,6 +32,22 @@ class ModelsCreation(TestCase):
         self.assertIsInstance(product, Product)
         self.assertEqual(product.__str__(), product.name)
 
+    def test_product_search_name(self):
+        """Test if the name is saved without case and accents"""
+        product = create_product()
+        product.name = "Sablé Fourré"
+        product.save()
+        product.refresh_from_db()
+        self.assertEqual(product.search_name, "sable fourre")
+
+    def test_product_nutrient_labels(self):
+        """Test if the levels of nutrients are described in french"""
+        product = create_product()
+        self.assertEqual(product.nutrient_labels(), [
+            'Matières grasses en quantitée faible (0g)',
+            'Sucres en quantitée élevée (25.5g)',
+            'Sel en quantitée faible (0.02794g)'])
+
     def test_favory_creation(self):
         """Test if a favory is created, with the default tag"""
         product = create_product()
@@ -1,14 +1,34 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
 
-from ..models import Product, Favory
-from ..views import NB_DISPLAYED_PRODUCTS
+from ..models import Catalog, PopularQuery, Product, Favory, SearchLog
+from ..utils.autocomplete import prefix_index
+from ..utils.random_pool import random_pool, sample_codes
+from ..utils.category_index import CategoryIndex, category_index
+from ..utils.favories import get_tags, tags_cache_key
+from ..utils.queries import search_logger
+from ..utils.ranking import NUTRIENT_FIELDS
+from ..utils.results import (
+    ResultCache, catalog_generation, detail_results, find_results,
+    search_results)
+from ..utils.substitutes import find_substitutes, search_substitutes
+from ..views import NB_DISPLAYED_PRODUCTS, NB_SUGGESTIONS
 
 
 class TestSearchProduct(TestCase):
     fixtures = ['19products']
 
+    def setUp(self):
+        search_results.clear()
+        find_results.clear()
+
     # test search a product by name
     def test_find_a_product(self):
         response = self.client.get(
@@ -18,6 +38,21 @@ class TestSearchProduct(TestCase):
             len(response.context["products"]),
             len(Product.objects.filter(name__icontains='test')))
 
+    # test the products starting with the query are displayed first
+    def test_search_ranking(self):
+        response = self.client.get(
+            f"{reverse('substitut:search')}?query=cookies")
+        names = [product.name for product in response.context["products"]]
+        self.assertEqual(
+            names, ["Cookies coeur tendre", "Britt Cookies Guava"])
+
+    # test search a product with a typo and without accents
+    def test_search_tolerates_typos(self):
+        response = self.client.get(
+            f"{reverse('substitut:search')}?query=sable fouré")
+        names = [product.name for product in response.context["products"]]
+        self.assertEqual(names[0], "Sablé Fourré à la Praline")
+
     # test search empty query
     def test_empty_query(self):
         response = self.client.get(
@@ -27,6 +62,40 @@ class TestSearchProduct(TestCase):
             len(response.context["products"]),
             min(len(Product.objects.all()), NB_DISPLAYED_PRODUCTS))
 
+    # test the random products are complete after products were deleted
+    def test_random_products_stale_pool(self):
+        random_pool.invalidate()
+        random_pool.get()
+        Product.objects.filter(nutriscore="d").delete()
+        products = random_pool.draw(NB_DISPLAYED_PRODUCTS)
+        self.assertEqual(len(products), NB_DISPLAYED_PRODUCTS)
+        self.assertEqual(len(set(products)), NB_DISPLAYED_PRODUCTS)
+        for product in products:
+            self.assertNotEqual(product.nutriscore, "d")
+
+    # test a table not analyzed yet is counted, and sorted randomly
+    # only if it is small
+    @patch('substitut_search.utils.random_pool.estimated_count',
+           return_value=0)
+    def test_sample_codes_not_analyzed(self, estimated_count):
+        all_codes = set(Product.objects.values_list('code', flat=True))
+        self.assertEqual(set(sample_codes(100)), all_codes)
+        #  the products are counted, then sampled with TABLESAMPLE
+        with self.assertNumQueries(2):
+            codes = sample_codes(5)
+        self.assertLessEqual(len(codes), 5)
+        self.assertTrue(set(codes) <= all_codes)
+
+    # test the codes of a large table are sampled with TABLESAMPLE
+    @patch('substitut_search.utils.random_pool.estimated_count',
+           return_value=10**6)
+    def test_sample_codes_large_table(self, estimated_count):
+        codes = sample_codes(100)
+        estimated_count.assert_called_once()
+        self.assertLessEqual(len(codes), 100)
+        self.assertTrue(
+            set(codes) <= set(Product.objects.values_list('code', flat=True)))
+
     # test if the substituts have a better nutriscore and share a category
     def test_find_a_substitut(self):
         product = Product.objects \
@@ -43,10 +112,313 @@ class TestSearchProduct(TestCase):
                 self.fail("A substitut doesn't share any"
                           " category with the initial product")
 
+    # test the substituts are searched with a single query, ranked
+    # by the smaller shared category then by nutriscore
+    def test_search_substituts_single_query(self):
+        product = Product.objects.get(name="Sablé Fourré à la Praline")
+        with self.assertNumQueries(1):
+            substituts = search_substitutes(product, NB_DISPLAYED_PRODUCTS)
+        self.assertEqual(
+            [substitut.nutriscore for substitut in substituts],
+            ["b", "c", "c"])
+
+    # test the substituts can be filtered by level of nutrient
+    def test_substituts_low_sugar(self):
+        product = Product.objects.get(name="Sablé Fourré à la Praline")
+        substituts = search_substitutes(
+            product, NB_DISPLAYED_PRODUCTS, max_levels={"sugars_level": 0})
+        self.assertTrue(substituts)
+        self.assertTrue(all(sbt.sugars_100g < 5 for sbt in substituts))
+        self.assertTrue(all(
+            sbt in search_substitutes(product, 100) for sbt in substituts))
+
+    # test the find page filters the substituts by level of nutrient,
+    # with the index enabled, and caches each filter apart
+    @override_settings(SUBSTITUTES_ENGINE='memory')
+    def test_find_low_sugar(self):
+        product = Product.objects.get(name="Sablé Fourré à la Praline")
+        url = f"{reverse('substitut:find')}?product_id={product.pk}"
+        every = self.client.get(url).context["products"]
+        response = self.client.get(f"{url}&low=sugars&low=unknown")
+        self.assertEqual(response.context["low"], ["sugars"])
+        substituts = response.context["products"]
+        self.assertTrue(substituts)
+        self.assertNotEqual(substituts, every)
+        self.assertTrue(all(sbt.sugars_level == 0 for sbt in substituts))
+        self.assertNotEqual(
+            response["ETag"], self.client.get(url)["ETag"])
+
+    # test the substituts with the same nutriscore are ranked
+    # by the similarity of their nutrients with the initial product
+    def test_substituts_ranked_by_nutrients(self):
+        product = Product.objects.get(name="Sablé Fourré à la Praline")
+        nutrients = {
+            "Sablé Fourré à la Praline": (20, 10, 30, 0.5),
+            "Galletas espelta bio organic miel": (5, 1, 10, 0.1),
+            "Belvita petit déjeuner original gout chocolat noisette":
+                (18, 9, 28, None)}
+        for name, quantities in nutrients.items():
+            Product.objects.filter(name=name).update(
+                **dict(zip(NUTRIENT_FIELDS, quantities)))
+        product.refresh_from_db()
+        expected = [
+            "Gullon Diet Avena Naranja",
+            "Belvita petit déjeuner original gout chocolat noisette",
+            "Galletas espelta bio organic miel"]
+        substituts = search_substitutes(product, NB_DISPLAYED_PRODUCTS)
+        self.assertEqual([sbt.name for sbt in substituts], expected)
+        with self.settings(SUBSTITUTES_ENGINE='memory'):
+            category_index.invalidate()
+            substituts = find_substitutes(product, NB_DISPLAYED_PRODUCTS)
+        self.assertEqual([sbt.name for sbt in substituts], expected)
+
+
+@override_settings(SUBSTITUTES_ENGINE='memory')
+class TestCategoryIndex(TestCase):
+    fixtures = ['19products']
+
+    def setUp(self):
+        category_index.invalidate()
+
+    # test the index finds the same substituts as the query, without query
+    def test_find_substituts_in_memory(self):
+        products = list(Product.objects.all())
+        category_index.get()
+        for product in products:
+            with self.assertNumQueries(0):
+                substituts = find_substitutes(product, NB_DISPLAYED_PRODUCTS)
+            self.assertEqual(
+                [(sbt.pk, sbt.name, sbt.nutriscore) for sbt in substituts],
+                [(sbt.pk, sbt.name, sbt.nutriscore) for sbt
+                 in search_substitutes(product, NB_DISPLAYED_PRODUCTS)])
+
+    # test all the candidates with the nutriscore of the last substitut
+    # are ranked by nutrients, however many they are
+    def test_find_ranks_whole_nutriscore(self):
+        rows = [("0", "c", ["en:biscuits"], "Initial", "", 20, 10, 30, 1)]
+        rows += [
+            (f"{code:03}", "a", ["en:biscuits"], "Candidate", "", 0, 0, 0, 0)
+            for code in range(1, 300)]
+        rows.append(
+            ("999", "a", ["en:biscuits"], "Closest", "", 20, 10, 30, 1))
+        index = CategoryIndex(rows)
+        self.assertEqual(
+            index.codes[index.find("0", 2)[0]], "999")
+
+    # test the query is used if the index is disabled
+    # or doesn't know the product
+    def test_fallback_to_database(self):
+        product = Product.objects.get(name="Sablé Fourré à la Praline")
+        with self.settings(SUBSTITUTES_ENGINE='database'):
+            self.assertIsNone(category_index.find(product, 1))
+        category_index.get()
+        product.pk = "unknown"
+        self.assertIsNone(category_index.find(product, 1))
+
+
+class TestAutocomplete(TestCase):
+    fixtures = ['19products']
+
+    def setUp(self):
+        prefix_index.invalidate()
+
+    # test the suggestions start with the query and are ranked by nutriscore
+    def test_suggestions(self):
+        response = self.client.get(
+            f"{reverse('substitut:autocomplete')}?query=sab")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [product["name"] for product in response.json()["products"]],
+            ["Sablé Fourré à la Praline", "Sablés Rhum Raisins"])
+
+    # test the products found by the popular queries are suggested first
+    def test_suggestions_popularity(self):
+        product = Product.objects.get(name="Sablés Rhum Raisins")
+        PopularQuery.objects.create(
+            query="rhum", count=10, products=[product.pk])
+        prefix_index.invalidate()
+        response = self.client.get(
+            f"{reverse('substitut:autocomplete')}?query=sab")
+        self.assertEqual(
+            [product["name"] for product in response.json()["products"]],
+            ["Sablés Rhum Raisins", "Sablé Fourré à la Praline"])
+
+    # test the suggestions are ranked with the popular queries aggregated
+    # by another process, at the next check of the index
+    @patch('substitut_search.utils.catalog.CHECK_INTERVAL', 0)
+    def test_suggestions_popularity_version(self):
+        self.assertEqual(
+            prefix_index.lookup("sab", NB_SUGGESTIONS)[0]["name"],
+            "Sablé Fourré à la Praline")
+        product = Product.objects.get(name="Sablés Rhum Raisins")
+        PopularQuery.objects.create(
+            query="rhum", count=10, products=[product.pk])
+        self.assertEqual(
+            prefix_index.lookup("sab", NB_SUGGESTIONS)[0]["name"],
+            "Sablés Rhum Raisins")
+
+    # test the number of suggestions is limited
+    def test_suggestions_limit(self):
+        response = self.client.get(
+            f"{reverse('substitut:autocomplete')}?query=g")
+        products = response.json()["products"]
+        self.assertEqual(len(products), 4)
+        self.assertEqual(products[0]["nutriscore"], "b")
+        response = self.client.get(
+            f"{reverse('substitut:autocomplete')}?query=")
+        self.assertEqual(response.json()["products"], [])
+        self.assertLessEqual(
+            len(prefix_index.lookup("", NB_SUGGESTIONS)), NB_SUGGESTIONS)
+
+
+class TestSearchLog(TestCase):
+    fixtures = ['19products']
+
+    def setUp(self):
+        catalog_generation.invalidate()
+        search_logger.take()
+        search_results.clear()
+
+    # test the searches are counted in memory, then written at once
+    def test_searches_logged(self):
+        for query in ["Cookies", "cookies ", "Sablé"]:
+            self.client.get(f"{reverse('substitut:search')}?query={query}")
+        self.client.get(f"{reverse('substitut:search')}?query=")
+        self.assertFalse(SearchLog.objects.exists())
+        with self.assertNumQueries(1):
+            search_logger.flush()
+        self.assertEqual(
+            dict(SearchLog.objects.values_list('query', 'count')),
+            {"cookies": 2, "sable": 1})
+
+    # test the results of a popular query are read from its table
+    def test_popular_query_results(self):
+        product = Product.objects.get(name="Sablés Rhum Raisins")
+        PopularQuery.objects.create(
+            query="sable", count=10, products=[product.pk],
+            generation=Catalog.current_generation())
+        response = self.client.get(
+            f"{reverse('substitut:search')}?query=Sablé")
+        self.assertEqual(list(response.context["products"]), [product])
+        Catalog.bump()
+        response = self.client.get(
+            f"{reverse('substitut:search')}?query=Sablé")
+        self.assertEqual(len(response.context["products"]), 2)
+
+
+class TestResultCache(TestCase):
+    fixtures = ['19products']
+
+    def setUp(self):
+        catalog_generation.invalidate()
+        search_results.clear()
+        find_results.clear()
+
+    # test the results of a query are cached until the next import
+    def test_search_cached(self):
+        url = f"{reverse('substitut:search')}?query=cookies"
+        names = [product.name for product
+                 in self.client.get(url).context["products"]]
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(
+            [product.name for product in response.context["products"]],
+            names)
+        self.assertEqual((search_results.hits, search_results.misses), (1, 1))
+        Product.objects.filter(name="Cookies coeur tendre").delete()
+        Catalog.bump()
+        response = self.client.get(url)
+        self.assertEqual(
+            [product.name for product in response.context["products"]],
+            ["Britt Cookies Guava"])
+        self.assertEqual(search_results.misses, 2)
+
+    # test the substituts are cached, but not the tags of the user
+    def test_find_cached(self):
+        product = Product.objects.get(name="Sablé Fourré à la Praline")
+        url = f"{reverse('substitut:find')}?product_id={product.pk}"
+        substituts = self.client.get(url).context["products"]
+        user = User.objects.create_user(
+            username="cache_user", password="cache_user_password")
+        Favory.objects.create(
+            user_profile=user.profile, product=product, tag="Cached")
+        self.client.login(
+            username="cache_user", password="cache_user_password")
+        response = self.client.get(url)
+        self.assertEqual(find_results.hits, 1)
+        self.assertEqual(response.context["products"], substituts)
+        self.assertEqual(response.context["initial_product"], product)
+        self.assertEqual(
+            response.context["fav_tags"], ["Cached", "Non classé"])
+
+    # test an unknown product isn't cached
+    def test_find_unknown_product(self):
+        url = f"{reverse('substitut:find')}?product_id=unknown"
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(find_results.misses, 2)
+
+
+@patch('substitut_search.utils.results.POLL_INTERVAL', 0.01)
+@patch.object(catalog_generation, 'get', return_value=1)
+class TestSingleFlight(TestCase):
+
+    def setUp(self):
+        self.results = ResultCache('test', serve_stale=True)
+        self.results.clear()
+        self.calls = 0
+
+    def slow_square(self, number):
+        self.calls += 1
+        time.sleep(0.2)
+        return number ** 2
+
+    # test concurrent requests of a missing result compute it once
+    def test_threads_coalesced(self, get):
+        squares = []
+        threads = [
+            threading.Thread(target=lambda: squares.append(
+                self.results.get_or_compute(self.slow_square, 3)))
+            for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(squares, [9] * 8)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(
+            (self.results.misses, self.results.coalesced), (1, 7))
+
+    # test a request waits for the result computed by another process
+    def test_wait_other_process(self, get):
+        key = self.results.key(3)
+        self.results.cache.add(f'{key}:lock', 1)
+        threading.Timer(
+            0.1, self.results.cache.set, [key, "computed elsewhere"]).start()
+        self.assertEqual(
+            self.results.get_or_compute(self.slow_square, 3),
+            "computed elsewhere")
+        self.assertEqual(self.calls, 0)
+
+    # test the result of the previous catalog is served
+    # while another process computes the new result
+    def test_serve_stale(self, get):
+        self.results.get_or_compute(self.slow_square, 3)
+        get.return_value = 2
+        self.results.cache.add(f'{self.results.key(3)}:lock', 1)
+        self.assertEqual(self.results.get_or_compute(self.slow_square, 3), 9)
+        self.assertEqual(self.results.stale, 1)
+        self.results.cache.delete(f'{self.results.key(3)}:lock')
+        self.results.get_or_compute(self.slow_square, 3)
+        self.assertEqual(self.calls, 2)
+
 
 class TestProductPage(TestCase):
     fixtures = ['2products']
 
+    def setUp(self):
+        detail_results.clear()
+
     # test product page contains the required informations
     def test_product_page(self):
         product = Product.objects.all()[0]
@@ -56,8 +428,93 @@ class TestProductPage(TestCase):
         self.assertContains(response, product.name)
         self.assertContains(response, product.nutriscore)
         self.assertContains(response, product.link)
-        for level in product.nutrient_levels:
-            self.assertContains(response, level)
+        self.assertEqual(len(product.nutrient_labels()), 4)
+        for label in product.nutrient_labels():
+            self.assertContains(response, label)
+
+    # test the informations of the product are rendered once,
+    # only its last change is read
+    def test_product_page_cached(self):
+        product = Product.objects.all()[0]
+        url = f"{reverse('substitut:detail')}?product_id={product.pk}"
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertContains(response, product.name)
+        self.assertEqual(detail_results.hits, 1)
+
+
+class TestConditionalGet(TestCase):
+    fixtures = ['19products']
+
+    def setUp(self):
+        catalog_generation.invalidate()
+        detail_results.clear()
+        find_results.clear()
+        self.product = Product.objects.get(name="Sablé Fourré à la Praline")
+
+    # test the product page isn't sent again until the product changes
+    def test_detail_not_modified(self):
+        url = f"{reverse('substitut:detail')}?product_id={self.product.pk}"
+        response = self.client.get(url)
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("max-age", response["Cache-Control"])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+        etag = response["ETag"]
+        Product.objects.filter(pk=self.product.pk).update(
+            updated_at=self.product.updated_at + timedelta(hours=1))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.product.name)
+
+    # test the substituts page isn't sent again until the next import
+    def test_find_not_modified(self):
+        url = f"{reverse('substitut:find')}?product_id={self.product.pk}"
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Catalog.bump()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    # test the public substituts page contains no CSRF token
+    def test_find_public_without_token(self):
+        url = f"{reverse('substitut:find')}?product_id={self.product.pk}"
+        response = self.client.get(url)
+        self.assertIn("public", response["Cache-Control"])
+        self.assertNotContains(response, "csrfmiddlewaretoken")
+        self.assertNotIn("csrftoken", response.cookies)
+
+    # test the pages of a user are private, and always rendered
+    # when they show the favories
+    def test_user_pages_private(self):
+        User.objects.create_user(
+            username="etag_user", password="etag_user_password")
+        self.client.login(username="etag_user", password="etag_user_password")
+        url = f"{reverse('substitut:find')}?product_id={self.product.pk}"
+        response = self.client.get(url)
+        self.assertFalse(response.has_header("ETag"))
+        self.assertContains(response, "csrfmiddlewaretoken")
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("no-cache", response["Cache-Control"])
+        url = f"{reverse('substitut:detail')}?product_id={self.product.pk}"
+        response = self.client.get(url)
+        self.assertFalse(response.has_header("Last-Modified"))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    # test an unknown product is still not found
+    def test_unknown_product(self):
+        for view in ['substitut:detail', 'substitut:find']:
+            response = self.client.get(
+                f"{reverse(view)}?product_id=unknown", HTTP_IF_NONE_MATCH="*")
+            self.assertEqual(response.status_code, 404)
 
 
 class TestFavories(TestCase):
@@ -75,6 +532,7 @@ class TestFavories(TestCase):
         cls.product = Product.objects.all()[0]
 
     def setUp(self):
+        find_results.clear()
         self.client.login(
             username=self.user.username, password=self.user_info["password"])
 
@@ -114,6 +572,31 @@ class TestFavories(TestCase):
             response.context["fav_tags"],
             ["A Test", "Non classé"])
 
+    # test the tags are cached, and refreshed when a favory is saved
+    def test_find_cached_tags(self):
+        url = f"{reverse('substitut:find')}?product_id={self.product.pk}"
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            get_tags(self.user.profile)
+        self.client.post(
+            reverse("substitut:favories"),
+            {"product_id": self.product.pk, "fav_tag": "A Test"})
+        response = self.client.get(url)
+        self.assertEqual(
+            response.context["fav_tags"],
+            ["A Test", "Non classé"])
+
+    # test the cached tags are stale for every process once a favory
+    # is saved, without deleting them from the cache of this process
+    def test_tags_version(self):
+        profile = self.user.profile
+        self.assertEqual(get_tags(profile), ["Non classé"])
+        Favory.objects.create(
+            user_profile=profile, product=self.product, tag="A Test")
+        self.assertEqual(cache.get(tags_cache_key(profile)), ["Non classé"])
+        profile.refresh_from_db()
+        self.assertEqual(get_tags(profile), ["A Test", "Non classé"])
+
     # test a user can see his favories
     def test_see_favories(self):
         Favory.objects.create(
@@ -135,3 +618,46 @@ class TestFavories(TestCase):
         response = self.client.get(reverse("substitut:favories"))
         self.assertTemplateUsed(
             response, "substitut_search/favories_unlogged.html")
+
+
+class TestFavoriesPages(TestCase):
+    fixtures = ['19products']
+
+    def setUp(self):
+        user_info = {"username": "test_user", "password": "test_password"}
+        self.user = User.objects.create_user(**user_info)
+        self.client.login(**user_info)
+
+    def save_favories(self, products, tag):
+        for product in products:
+            Favory.objects.create(
+                user_profile=self.user.profile, product=product, tag=tag)
+
+    # test the number of queries doesn't depend on the number of favories
+    def test_see_favories_constant_queries(self):
+        products = list(Product.objects.order_by('code'))
+        self.save_favories(products[:1], "Test")
+        with self.assertNumQueries(5):
+            self.client.get(reverse("substitut:favories"))
+        self.save_favories(products[1:15], "Test")
+        self.save_favories(products[15:], "Non classé")
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("substitut:favories"))
+        fav_dict = response.context['fav_dict']
+        self.assertEqual(list(fav_dict), ["Non classé", "Test"])
+        self.assertEqual(fav_dict["Non classé"], products[:14:-1])
+        self.assertEqual(fav_dict["Test"], products[14:2:-1])
+        self.assertEqual(response.context['more_tags'], ["Test"])
+
+    # test the next pages of a tag can be loaded
+    def test_see_favories_next_page(self):
+        products = list(Product.objects.order_by('code'))
+        self.save_favories(products[:15], "Test")
+        response = self.client.get(
+            reverse("substitut:favories"), {"tag": "Test", "page": 2})
+        self.assertEqual(response.context['products'], products[2::-1])
+        self.assertEqual(response['X-Has-More'], "0")
+        response = self.client.get(
+            reverse("substitut:favories"), {"tag": "Test", "page": 1})
+        self.assertEqual(len(response.context['products']), 12)
+        self.assertEqual(response['X-Has-More'], "1")
@@ -5,6 +5,7 @@ from . import views
 app_name = "substitut"
 urlpatterns = [
     path('search/', views.search, name='search'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
     path('find/', views.find, name='find'),
     path('detail/', views.detail, name='detail'),
     path('favories/', views.favories, name='favories'),
@@ -0,0 +1,76 @@
+from bisect import bisect_left
+import heapq
+
+from ..models import Product
+from .catalog import VersionedIndex
+from .queries import popularity_version, product_popularity
+from .text import normalize
+
+#  Above this number of matching names, the top products of a prefix
+#  are memorized, so short prefixes are only ranked once per generation
+MEMO_THRESHOLD = 1000
+
+
+class PrefixIndex:
+    """Sorted array of the normalized product names.
+    The names starting with a prefix are a contiguous slice of the array,
+    found by bisection, then ranked by popularity, nutriscore and name"""
+
+    def __init__(self, rows, popularity=None):
+        """Takes an iterable of (search_name, nutriscore, name, code),
+        and a dict {code: popularity} of the popular products"""
+        popularity = popularity or {}
+        rows = sorted(rows)
+        self.keys = [row[0] for row in rows]
+        self.ranks = [
+            (-popularity.get(row[3], 0), row[1], row[2]) for row in rows]
+        self.codes = [row[3] for row in rows]
+        self._memo = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, prefix, limit):
+        """Return the 'limit' best products whose names start with the prefix,
+        as a list of dicts with the code, name and nutriscore"""
+        prefix = normalize(prefix)
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + "\uffff", start)
+        if end - start > MEMO_THRESHOLD:
+            key = (prefix, limit)
+            if key not in self._memo:
+                self._memo[key] = self._top(start, end, limit)
+            positions = self._memo[key]
+        else:
+            positions = self._top(start, end, limit)
+        return [
+            {
+                "code": self.codes[position],
+                "name": self.ranks[position][2],
+                "nutriscore": self.ranks[position][1]}
+            for position in positions]
+
+    def _top(self, start, end, limit):
+        return heapq.nsmallest(
+            limit, range(start, end), key=self.ranks.__getitem__)
+
+
+class ProductsPrefixIndex(VersionedIndex):
+    """PrefixIndex of all the products, rebuilt after each import
+    and each aggregation of the popular queries, with the popularity
+    of the products found by the popular queries"""
+
+    def version(self):
+        return (super().version(), popularity_version())
+
+    def build(self):
+        return PrefixIndex(
+            Product.objects.values_list(
+                'search_name', 'nutriscore', 'name', 'code').iterator(),
+            product_popularity())
+
+    def lookup(self, prefix, limit):
+        return self.get().lookup(prefix, limit)
+
+
+prefix_index = ProductsPrefixIndex()
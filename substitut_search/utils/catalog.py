@@ -0,0 +1,53 @@
+import threading
+import time
+
+from ..models import Catalog
+from ..signals import catalog_updated
+
+#  Minimum number of seconds between two reads of the catalog generation
+CHECK_INTERVAL = 5
+
+
+class VersionedIndex:
+    """Base class of the structures built in memory from the products.
+    The structure is built on first use, then rebuilt when its version,
+    by default the catalog generation, changes: immediately if the import
+    ran in this process, else at the next check, at most CHECK_INTERVAL
+    seconds later.
+    Subclasses implement 'build', returning the structure to keep,
+    and may override 'version' if the structure uses other tables"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._checked_at = 0
+        catalog_updated.connect(self._on_catalog_updated, weak=False)
+
+    def build(self):
+        raise NotImplementedError
+
+    def version(self):
+        """Return the version of the data the structure is built from"""
+        return Catalog.current_generation()
+
+    def get(self):
+        """Return the structure, built for the current version"""
+        now = time.monotonic()
+        if self._data is not None and now - self._checked_at < CHECK_INTERVAL:
+            return self._data
+        version = self.version()
+        with self._lock:
+            if self._data is None or version != self._version:
+                self._data = self.build()
+                self._version = version
+            self._checked_at = now
+        return self._data
+
+    def invalidate(self):
+        """Drop the structure, it will be rebuilt on next use"""
+        with self._lock:
+            self._data = None
+
+    def _on_catalog_updated(self, sender, **kwargs):
+        self.invalidate()
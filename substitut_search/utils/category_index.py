@@ -0,0 +1,170 @@
+from array import array
+
+from django.conf import settings
+from django.db.models import CharField, Value
+
+import numpy as np
+
+from ..models import Product
+from .catalog import VersionedIndex
+from .ranking import NUTRIENT_FIELDS, rank_substitutes
+
+
+class CategoryIndex:
+    """Inverted index of the categories, kept in memory.
+    The products are numbered by nutriscore then code, so each posting
+    list, a sorted int32 array of product numbers, is also sorted
+    by nutriscore: the products with a better nutriscore than a product
+    are the start of the list, found by bisection"""
+
+    def __init__(self, rows):
+        """Takes an iterable of (code, nutriscore, categories, name, image,
+        and the quantities of NUTRIENT_FIELDS)"""
+        rows = sorted(rows, key=lambda row: (row[1], row[0]))
+        self.codes = [row[0] for row in rows]
+        self.names = [row[3] for row in rows]
+        self.images = [row[4] for row in rows]
+        self.nutriscores = np.array(
+            [ord(row[1]) - ord("a") for row in rows], dtype=np.int8)
+        self.nutrients = np.array(
+            [row[5:] for row in rows], dtype=float).reshape(len(rows), -1)
+        self.numbers = {code: number for number, code in enumerate(self.codes)}
+        tags = {}
+        postings = []
+        #  categories of all the products, one after the other: the
+        #  categories of a product start at its offset, end at the next one
+        members = array('i')
+        offsets = array('q', [0])
+        for number, row in enumerate(rows):
+            for tag in row[2]:
+                if tag not in tags:
+                    tags[tag] = len(postings)
+                    postings.append(array('i'))
+                posting = postings[tags[tag]]
+                #  a tag may be repeated in the categories of a product
+                if not posting or posting[-1] != number:
+                    posting.append(number)
+                members.append(tags[tag])
+            offsets.append(len(members))
+        self.members = np.frombuffer(members, dtype=np.int32)
+        self.offsets = np.frombuffer(offsets, dtype=np.int64)
+        self.postings = [np.frombuffer(posting, dtype=np.int32)
+                         for posting in postings]
+        #  first product number of each nutriscore
+        self.boundaries = np.searchsorted(
+            self.nutriscores, np.arange(6, dtype=np.int8))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def categories(self, number):
+        """Return the category numbers of a product, in the order
+        of its categories"""
+        return self.members[self.offsets[number]:self.offsets[number + 1]]
+
+    def find(self, code, limit):
+        """Return the numbers of the substitutes of a product, ranked like
+        'search_substitutes', or None if the product isn't indexed"""
+        number = self.numbers.get(code)
+        if number is None:
+            return None
+        boundary = self.boundaries[self.nutriscores[number]]
+        categories = self.categories(number)
+        found = np.empty(0, dtype=np.int32)
+        depths = [found]
+        for depth in reversed(range(len(categories))):
+            posting = self.postings[categories[depth]]
+            head = posting[:np.searchsorted(posting, boundary)]
+            head = head[~np.isin(head, found)]
+            if len(found) + len(head) > limit:
+                #  the candidates are only ordered by nutriscore here:
+                #  keep all the products with the nutriscore
+                #  of the last needed one, to rank them by nutrients
+                last = head[limit - len(found) - 1]
+                end = self.boundaries[self.nutriscores[last] + 1]
+                head = head[:np.searchsorted(head, end)]
+            found = np.concatenate((found, head))
+            depths.append(np.full(len(head), depth))
+            if len(found) >= limit:
+                break
+        order = rank_substitutes(
+            self.nutrients[number], self.nutrients[found],
+            np.concatenate(depths), self.nutriscores[found])
+        return found[order[:limit]].tolist()
+
+    def worse(self, codes):
+        """Return the codes of the products sharing a category with
+        one of the given products and having a worse nutriscore than it.
+        Each category is sliced once, after the best nutriscore
+        of the given products in it"""
+        best = {}
+        for code in codes:
+            number = self.numbers.get(code)
+            if number is None:
+                continue
+            nutriscore = self.nutriscores[number]
+            for category in self.categories(number):
+                if nutriscore < best.get(category, len(self.boundaries)):
+                    best[category] = nutriscore
+        members = [
+            self.postings[category][np.searchsorted(
+                self.postings[category], self.boundaries[nutriscore + 1]):]
+            for category, nutriscore in best.items()]
+        if not members:
+            return set()
+        return {self.codes[member]
+                for member in np.unique(np.concatenate(members))}
+
+    def product(self, number):
+        """Build the product to display, without querying the database"""
+        return Product(
+            code=self.codes[number],
+            nutriscore=chr(ord("a") + self.nutriscores[number]),
+            name=self.names[number],
+            image=self.images[number])
+
+
+def load_category_index(displayed=True):
+    """Build a CategoryIndex of all the products in the database.
+    Without 'displayed', the names and images aren't loaded,
+    for the computations which don't display the products"""
+    products = Product.objects.all()
+    fields = ['name', 'image']
+    if not displayed:
+        products = products.annotate(blank=Value('', CharField()))
+        fields = ['blank', 'blank']
+    return CategoryIndex(products.values_list(
+        'code', 'nutriscore', 'categories', *fields,
+        *NUTRIENT_FIELDS).iterator())
+
+
+class ProductsCategoryIndex(VersionedIndex):
+    """CategoryIndex of all the products, rebuilt after each import.
+    It is only used if the setting SUBSTITUTES_ENGINE is 'memory'"""
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'SUBSTITUTES_ENGINE', None) == 'memory'
+
+    def build(self):
+        return load_category_index()
+
+    def find(self, product, limit):
+        """Return the substitutes of a product,
+        or None if the index is disabled or doesn't know the product"""
+        if not self.enabled:
+            return None
+        index = self.get()
+        numbers = index.find(product.pk, limit)
+        if numbers is None:
+            return None
+        return [index.product(number) for number in numbers]
+
+    def load(self):
+        """Build the index now if it is enabled, to load it
+        when a worker starts instead of during its first request"""
+        if self.enabled:
+            self.get()
+
+
+category_index = ProductsCategoryIndex()
@@ -0,0 +1,183 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+
+SEARCH_URL = "https://fr.openfoodfacts.org/cgi/search.pl"
+USER_AGENT = 'PurBeurre_WebApp - Version 1.0'
+#  The OpenFoodFacts maximum page size
+PAGE_SIZE = 1000
+#  Number of pages downloaded at the same time
+CONCURRENCY = 4
+#  OpenFoodFacts allows 10 search requests per minute
+RATE_LIMIT = 10
+#  Number of retries of a failed request, waiting BACKOFF seconds
+#  before the first retry, then twice longer before each next one
+MAX_RETRIES = 3
+BACKOFF = 2.0
+#  Number of seconds to wait for the server to respond
+TIMEOUT = 60
+#  Status codes of the responses worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Space the requests sent by all the threads,
+    to send at most 'per_minute' requests per minute"""
+
+    def __init__(self, per_minute):
+        self.interval = 60 / per_minute if per_minute else 0
+        self.lock = threading.Lock()
+        self.next_time = 0
+
+    def wait(self):
+        """Wait until the next request can be sent"""
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class HTTPTransport:
+    """Send the requests to OpenFoodFacts through a shared keep-alive
+    session, retrying the connection errors, timeouts and server errors"""
+
+    def __init__(self, concurrency=CONCURRENCY, rate=RATE_LIMIT,
+                 retries=MAX_RETRIES, backoff=BACKOFF):
+        self.retries = retries
+        self.backoff = backoff
+        self.limiter = RateLimiter(rate)
+        self.session = requests.Session()
+        self.session.headers['user-agent'] = USER_AGENT
+        adapter = HTTPAdapter(pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, url, payload):
+        """Return the raw body of the response to a request"""
+        for attempt in range(self.retries + 1):
+            self.limiter.wait()
+            delay = self.backoff * 2 ** attempt
+            try:
+                response = self.session.get(
+                    url, params=payload, timeout=TIMEOUT)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response.content
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+                error = requests.HTTPError(
+                    f'{response.status_code} error', response=response)
+            except (requests.ConnectionError, requests.Timeout) as exception:
+                error = exception
+            if attempt == self.retries:
+                raise error
+            time.sleep(delay)
+
+
+class PageNotCached(Exception):
+    """A page missing in the cache was requested offline"""
+
+
+class CachedTransport:
+    """Record the responses of a transport in a directory, one gzipped
+    file per request, and replay them when the same request is sent again.
+    When offline, only the recorded responses are used"""
+
+    def __init__(self, directory, transport=None, offline=False):
+        self.directory = directory
+        self.transport = transport
+        self.offline = offline
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, url, payload):
+        """Path of the recorded response to a request,
+        named after the hash of its url and sorted parameters"""
+        key = json.dumps([url, sorted(payload.items())])
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{name}.json.gz')
+
+    def fetch(self, url, payload):
+        """Return the recorded response to a request,
+        or send it and record its response"""
+        path = self.path(url, payload)
+        try:
+            with gzip.open(path, 'rb') as recorded:
+                return recorded.read()
+        except FileNotFoundError:
+            if self.offline or self.transport is None:
+                raise PageNotCached(f'No recorded response for {payload}')
+        body = self.transport.fetch(url, payload)
+        #  written aside then renamed, so a page is never read half written
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with gzip.open(temporary, 'wb') as recording:
+            recording.write(body)
+        os.replace(temporary, path)
+        return body
+
+
+class PageDownloader:
+    """Download pages of products from the OpenFoodFacts search,
+    several pages at a time, through a transport: by default an
+    HTTPTransport, recorded in 'cache_dir' if it is given.
+    The search url can be changed with the setting OPENFOODFACTS_URL"""
+
+    def __init__(self, concurrency=CONCURRENCY, rate=RATE_LIMIT,
+                 retries=MAX_RETRIES, backoff=BACKOFF, url=None,
+                 cache_dir=None, offline=False, transport=None):
+        self.concurrency = concurrency
+        self.url = url or getattr(settings, 'OPENFOODFACTS_URL', SEARCH_URL)
+        if offline and cache_dir is None:
+            raise ValueError('The offline downloads need a cache directory')
+        if transport is None and not offline:
+            transport = HTTPTransport(concurrency, rate, retries, backoff)
+        if cache_dir is not None:
+            transport = CachedTransport(cache_dir, transport, offline)
+        self.transport = transport
+
+    def payload(self, page, page_size):
+        """Parameters of the request of a page"""
+        return {
+            "sort_by": "unique_scans_n",
+            "action": "process",
+            "json": 1,
+            "page_size": page_size,
+            "page": page}
+
+    def get_page(self, page, page_size):
+        """Download one page of products, starting from 1"""
+        body = self.transport.fetch(self.url, self.payload(page, page_size))
+        return json.loads(body)["products"]
+
+    def page_sizes(self, nb_products):
+        """Split a number of products in pages of at most PAGE_SIZE"""
+        full_pages, rest = divmod(nb_products, PAGE_SIZE)
+        return [PAGE_SIZE] * full_pages + ([rest] if rest else [])
+
+    def pages(self, nb_products, first_page=1):
+        """Download the pages needed to get 'nb_products' products,
+        from 'first_page' to the last page,
+        and yield the products of each page, in the order of the pages.
+        At most 'concurrency' pages are downloaded ahead of the page
+        being used, so the pages don't pile up in memory"""
+        pending = deque()
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            sizes = self.page_sizes(nb_products)[first_page - 1:]
+            for page, size in enumerate(sizes, start=first_page):
+                if len(pending) == self.concurrency:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(self.get_page, page, size))
+            while pending:
+                yield pending.popleft().result()
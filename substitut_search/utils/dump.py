@@ -0,0 +1,141 @@
+import csv
+import gzip
+import json
+from itertools import chain, islice
+
+from .fill_db import FillDB, batches, parse_product
+
+#  Number of records sent at once to a worker process
+CHUNK_SIZE = 2000
+#  Number of products read between two progress reports
+PROGRESS_INTERVAL = 100000
+#  Quantities per 100g under which the level of a nutrient is low,
+#  and above which it is high, as computed by OpenFoodFacts
+LEVEL_THRESHOLDS = {
+    'fat': (3, 17.5),
+    'saturated-fat': (1.5, 5),
+    'sugars': (5, 22.5),
+    'salt': (0.3, 1.5)}
+#  The CSV fields can be longer than the csv module default limit
+csv.field_size_limit(2 ** 31 - 1)
+
+
+def open_dump(path):
+    """Open a dump as text, decompressing it on the fly if it is gzipped"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_dump(path):
+    """Yield the records of an OpenFoodFacts dump, one at a time:
+    the lines of a JSONL dump, or the rows of a CSV dump as dicts.
+    The CSV dumps of OpenFoodFacts are separated by tabs"""
+    with open_dump(path) as dump:
+        if not path.replace('.gz', '').endswith('.csv'):
+            yield from (line for line in dump if line.strip())
+            return
+        header = dump.readline()
+        if '\t' in header:
+            delimiter, quoting = '\t', csv.QUOTE_NONE
+        else:
+            delimiter, quoting = ',', csv.QUOTE_MINIMAL
+        yield from csv.DictReader(
+            chain([header], dump), delimiter=delimiter, quoting=quoting)
+
+
+def nutrient_level(nutrient, quantity):
+    """Level of a nutrient from its quantity per 100g"""
+    low, high = LEVEL_THRESHOLDS[nutrient]
+    if quantity < low:
+        return 'low'
+    if quantity > high:
+        return 'high'
+    return 'moderate'
+
+
+def from_csv(row):
+    """Convert a row of a CSV dump to a product of the OpenFoodFacts API"""
+    product = {
+        "code": row.get("code"),
+        "nutrition_grade_fr":
+            row.get("nutrition_grade_fr") or row.get("nutriscore_grade"),
+        "categories_tags": [
+            tag for tag in (row.get("categories_tags") or "").split(",")
+            if tag],
+        "product_name": row.get("product_name"),
+        "url": row.get("url"),
+        "image_front_small_url":
+            row.get("image_front_small_url") or row.get("image_small_url"),
+        "nutriments": {},
+        "nutrient_levels": {}}
+    for nutrient in LEVEL_THRESHOLDS:
+        try:
+            quantity = float(row[nutrient+'_100g'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        product["nutriments"][nutrient+'_100g'] = quantity
+        product["nutrient_levels"][nutrient] = nutrient_level(
+            nutrient, quantity)
+    return product
+
+
+def from_json(product):
+    """Complete a product of a JSONL dump with the fields
+    of the OpenFoodFacts API missing in the dumps"""
+    product.setdefault(
+        "nutrition_grade_fr", product.get("nutriscore_grade"))
+    product.setdefault(
+        "url", f"https://fr.openfoodfacts.org/produit/{product.get('code')}")
+    return product
+
+
+def parse_record(record):
+    """Validate a record of a dump and convert it to a dict of Product
+    fields, or return None if it can't be saved"""
+    if isinstance(record, str):
+        try:
+            product = json.loads(record)
+        except ValueError:
+            return None
+        if not isinstance(product, dict):
+            return None
+        return parse_product(from_json(product))
+    return parse_product(from_csv(record))
+
+
+class DumpImporter(FillDB):
+    """Use this class to fill the database from an OpenFoodFacts dump,
+    stored locally as JSONL or CSV, optionally gzipped.
+    With several 'workers', the chunks of records are shared by worker
+    processes, which parse and write them.
+    The 'progress' function is called with the ImportStats
+    every PROGRESS_INTERVAL products"""
+
+    def __init__(self, path=None, workers=1, progress=None):
+        super().__init__(workers=workers)
+        self.path = path
+        self.progress = progress
+        self.reported = 0
+        self.worker_options = {}
+
+    parse = staticmethod(parse_record)
+
+    def dl_products(self, offset=0):
+        """Read the records of the dump, except the first 'offset' records"""
+        return islice(read_dump(self.path), offset, None)
+
+    def partitions(self):
+        """Yield the chunks of records of the dump"""
+        return batches(self.dl_products(), CHUNK_SIZE)
+
+    def read_part(self, part):
+        """The records of a chunk are already read"""
+        return part
+
+    def report(self, stats):
+        """Call 'progress' each time PROGRESS_INTERVAL more records are read"""
+        if self.progress and (
+                stats.downloaded // PROGRESS_INTERVAL > self.reported):
+            self.reported = stats.downloaded // PROGRESS_INTERVAL
+            self.progress(stats)
@@ -0,0 +1,97 @@
+from itertools import groupby
+
+from django.core.cache import cache
+from django.db.models import Count, F
+
+from accounts.models import Profile
+
+from ..models import Favory, Product
+
+DEFAULT_TAG = "Non classé"
+#  Number of seconds the tags of a user are cached
+TAGS_CACHE_TIMEOUT = 3600
+
+
+def tags_cache_key(profile):
+    return f"fav_tags:{profile.pk}:{profile.tags_version}"
+
+
+def get_tags(profile):
+    """Return the sorted tags of the favories of a user,
+    with the default tag. The distinct tags are fetched from the index
+    on (user_profile, tag), then cached with the tags version
+    of the profile, so each process sees when the user saves a product"""
+    key = tags_cache_key(profile)
+    tags = cache.get(key)
+    if tags is None:
+        tags = set(
+            Favory.objects
+            .filter(user_profile=profile)
+            .order_by('tag')
+            .values_list('tag', flat=True)
+            .distinct())
+        tags = sorted(tags | {DEFAULT_TAG})
+        cache.set(key, tags, TAGS_CACHE_TIMEOUT)
+    return tags
+
+
+def invalidate_tags(profile_pks):
+    """Increment the tags version of the given profiles,
+    so their cached tags aren't read anymore"""
+    Profile.objects.filter(pk__in=profile_pks).update(
+        tags_version=F('tags_version') + 1)
+
+
+def saved_products(profile, products):
+    """Return the codes of the given products saved by a user"""
+    return set(
+        Favory.objects
+        .filter(user_profile=profile, product__in=products)
+        .values_list('product', flat=True))
+
+
+def count_tags(profile):
+    """Return a dict {tag: number of products} of the favories of a user,
+    ordered by tag, counted by the database"""
+    return dict(
+        Favory.objects
+        .filter(user_profile=profile)
+        .values_list('tag')
+        .annotate(count=Count('id'))
+        .order_by('tag'))
+
+
+def first_pages(profile, page_size):
+    """Return a dict {tag: products} with the last 'page_size' products
+    saved by a user in each tag, fetched in a single query:
+    the favories are numbered in each tag by a window function"""
+    products = Product.objects.raw(
+        f'''SELECT product.*, ranked.tag AS fav_tag
+        FROM (
+            SELECT product_id, tag, row_number() OVER (
+                PARTITION BY tag ORDER BY saved_at DESC, id DESC
+            ) AS position
+            FROM "{Favory._meta.db_table}"
+            WHERE user_profile_id = %s
+        ) AS ranked
+        JOIN "{Product._meta.db_table}" AS product
+            ON product.code = ranked.product_id
+        WHERE ranked.position <= %s
+        ORDER BY ranked.tag, ranked.position''',
+        [profile.pk, page_size])
+    return {
+        tag: list(tag_products)
+        for tag, tag_products in groupby(
+            products, key=lambda product: product.fav_tag)}
+
+
+def tag_page(profile, tag, page, page_size):
+    """Return the products saved by a user in a tag, for the given page
+    starting from 1, and True if there are more products after this page"""
+    start = (page - 1) * page_size
+    products = list(
+        Product.objects
+        .filter(favory__user_profile=profile, favory__tag=tag)
+        .order_by('-favory__saved_at', '-favory__id')
+        [start:start + page_size + 1])
+    return products[:page_size], len(products) > page_size
@@ -1,129 +1,410 @@
-import requests
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 
-from django.db import IntegrityError, DataError, transaction
+from django.db import IntegrityError, DataError, connections, transaction
 
-from ..models import Product
+from ..models import Catalog, Product
+from .downloader import CONCURRENCY, PAGE_SIZE, RATE_LIMIT, PageDownloader
+from .hashing import content_hash
+from .random_pool import analyze_products
+from .ranking import NUTRIENT_FIELDS
+from .staging import (
+    build_indexes, create_staging, drop_staging, keep_favorite_products,
+    swap_staging)
+from .substitutes import compute_substitutes
+from .text import normalize
 
+#  Number of products validated and written at once
+BATCH_SIZE = 1000
+#  Names of the nutrients in the OpenFoodFacts products,
+#  in the order of LEVEL_FIELDS and NUTRIENT_FIELDS
+NUTRIENTS = ['fat', 'saturated-fat', 'sugars', 'salt']
+#  Fields of Product storing the levels of nutrients
+LEVEL_FIELDS = [
+    'fat_level', 'saturated_fat_level', 'sugars_level', 'salt_level']
+#  Values of the OpenFoodFacts levels in the level fields
+LEVELS = {'low': 0, 'moderate': 1, 'high': 2}
+#  Fields of Product compared to detect the changed products
+HASHED_FIELDS = [
+    'nutriscore', 'categories', 'name', 'link', 'image',
+    *LEVEL_FIELDS, *NUTRIENT_FIELDS]
+#  Fields of Product written when a product changed
+UPDATED_FIELDS = [
+    *HASHED_FIELDS, 'search_name', 'content_hash', 'substitutes_stale',
+    'updated_at']
 
-def trad(word):
-    """Translate the nutriments information in french"""
-    initial_words = [
-        'saturated-fat', 'fat', 'sugars', 'salt',
-        'low', 'moderate', 'high']
-    trad_words = [
-        'Acides gras saturés', 'Matières grasses', 'Sucres', 'Sel',
-        'faible', 'modérée', 'élevée']
-    return trad_words[initial_words.index(word)]
 
+def get_levels(product):
+    """Get the levels of nutrients from an OpenFoodFact downloaded product,
+    as a dict of Product fields.
+    A missing or unknown level is None"""
+    levels = product.get('nutrient_levels')
+    if not isinstance(levels, dict):
+        levels = {}
+    return {
+        field: LEVELS.get(levels.get(nutrient))
+        for nutrient, field in zip(NUTRIENTS, LEVEL_FIELDS)}
 
-def get_nutrients(product):
-    """Get the nutrients from an OpenFoodFact downloaded product,
-    by getting the level and the quantity per 100g"""
-    result = []
-    for nutrient in ['fat', 'saturated-fat', 'sugars', 'salt']:
+
+def get_quantities(product):
+    """Get the quantities of nutrients per 100g from an OpenFoodFact
+    downloaded product, as a dict of Product fields.
+    A missing or invalid quantity is None"""
+    quantities = {}
+    for nutrient, field in zip(NUTRIENTS, NUTRIENT_FIELDS):
         try:
-            level = product['nutrient_levels'][nutrient]
-            quantity = product['nutriments'][nutrient+'_100g']
-        except KeyError:
-            continue
-        # gerer string vide
-        string = f"{trad(nutrient)} en quantitée {trad(level)} ({quantity}g)"
-        result.append(string)
-    return result
+            quantities[field] = float(
+                product['nutriments'][nutrient+'_100g'])
+        except (KeyError, TypeError, ValueError):
+            quantities[field] = None
+    return quantities
+
+
+def max_length(field):
+    """Maximum length of a Product field, or of the items of an array field"""
+    field = Product._meta.get_field(field)
+    return getattr(field, 'base_field', field).max_length
+
+
+def valid_strings(strings, field):
+    """Check the strings fit in the Product field"""
+    length = max_length(field)
+    return all(isinstance(string, str) and len(string) <= length
+               for string in strings)
+
+
+def parse_product(product):
+    """Validate an OpenFoodFacts downloaded product and convert it
+    to a dict of Product fields, or return None if it can't be saved"""
+    try:
+        fields = {
+            'code': product["code"],
+            'nutriscore': product["nutrition_grade_fr"].lower(),
+            'categories': product["categories_tags"],
+            'name': product["product_name"].title(),
+            'link': product["url"],
+            'image': product["image_front_small_url"]}
+    except (KeyError, AttributeError):
+        return None
+    nutriscores = [choice for choice, label in Product.ns_choices]
+    if not (fields['nutriscore'] in nutriscores
+            and isinstance(fields['categories'], list)
+            and valid_strings(fields['categories'], 'categories')
+            and all(valid_strings([fields[field]], field)
+                    for field in ['code', 'name', 'link', 'image'])):
+        return None
+    fields['search_name'] = normalize(fields['name'])
+    fields.update(get_levels(product))
+    fields.update(get_quantities(product))
+    fields['content_hash'] = content_hash(
+        [fields[field] for field in HASHED_FIELDS])
+    return fields
+
+
+def batches(iterable, size):
+    """Split an iterable in lists of 'size' items, the last one may be shorter"""
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+class ImportStats:
+    """Counters of an import, to report its throughput"""
+
+    def __init__(self):
+        self.downloaded = 0
+        self.rejected = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.duration = 0.0
+
+    @property
+    def rate(self):
+        """Number of products inserted or updated per second"""
+        if not self.duration:
+            return 0.0
+        return (self.inserted + self.updated) / self.duration
+
+    def merge(self, other):
+        """Add the counters of the ImportStats of a worker"""
+        self.downloaded += other.downloaded
+        self.rejected += other.rejected
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+
+
+#  FillDB of the current worker process of a parallel import
+worker_fill_db = None
+
+
+def init_worker(cls, options):
+    """Create the FillDB of a worker process"""
+    global worker_fill_db
+    worker_fill_db = cls(**options)
+
+
+def import_part(write, part):
+    """Read, parse and write a part of an import in a worker process,
+    with its own database connection.
+    Return the ImportStats of the part"""
+    stats = ImportStats()
+    products = worker_fill_db.read_part(part)
+    worker_fill_db.write_batches(
+        stats, getattr(worker_fill_db, write),
+        worker_fill_db.parse_products(products, stats))
+    return stats
 
 
 class FillDB:
     """Use this class to download products from fr.openfoodfacts.org
-    and fill the database"""
+    and fill the database.
+    With an ImportCheckpoint, the progress is saved with each batch,
+    and the import starts after the products already written.
+    With a 'cache_dir', the downloaded pages are recorded and replayed,
+    without network access if 'offline' is True.
+    With several 'workers', the pages are shared by worker processes,
+    which don't save checkpoints: a resumed import starts again
+    from the first page"""
 
-    def __init__(self, nb_products=1000):
+    def __init__(self, nb_products=1000, concurrency=CONCURRENCY,
+                 checkpoint=None, cache_dir=None, offline=False,
+                 workers=1, rate=RATE_LIMIT):
         self.nb_products = nb_products
+        self.downloader = PageDownloader(
+            concurrency=concurrency, rate=rate,
+            cache_dir=cache_dir, offline=offline)
+        self.checkpoint = checkpoint
+        self.workers = workers
+        #  the options of the FillDB of the worker processes,
+        #  which share the rate limit
+        self.worker_options = {
+            'concurrency': 1, 'cache_dir': cache_dir, 'offline': offline,
+            'rate': rate / workers if rate else rate}
 
     def dl_page(self, nb, page):
         """Download one page of products from OpenFoodfacts.org.
         Takes as args the page size as 'nb' and the page number as 'page'"""
-        payload = {
-            "sort_by": "unique_scans_n",
-            "action": "process",
-            "json": 1,
-            "page_size": nb,
-            "page": page}
-        headers = {'user-agent': 'PurBeurre_WebApp - Version 1.0'}
-        raw_result = requests.get(
-            "https://fr.openfoodfacts.org/cgi/search.pl",
-            params=payload,
-            headers=headers)
-        return raw_result.json()["products"]
-
-    def dl_products(self):
-        """Download the requested number of products from OpenFoodFacts.
-        As the maximum page size is 1000, the function may need to launch
-        the sub-function 'dl-page' several times"""
-        products_list = []
-        nb_products = self.nb_products
-        page = 1
-        #  The OpenFoodFacts maximum page size is 1000
-        #  The loop will dl the products 1000 by 1000 while incrementing the
-        #  page number, until the number of products left to dl is under 1000
-        while nb_products > 1000:
-            products_list += self.dl_page(1000, page)
-            page += 1
-            nb_products -= 1000
-        products_list += self.dl_page(nb_products, page)
-        return products_list
+        return self.downloader.get_page(page, nb)
+
+    def dl_products(self, offset=0):
+        """Download the requested number of products from OpenFoodFacts,
+        except the first 'offset' products, and yield them as soon as
+        their page is downloaded.
+        As the maximum page size is 1000, the downloader may need
+        several pages, downloaded concurrently"""
+        skip = offset % PAGE_SIZE
+        for page in self.downloader.pages(
+                self.nb_products, first_page=offset // PAGE_SIZE + 1):
+            yield from page[skip:]
+            skip = 0
+
+    parse = staticmethod(parse_product)
+
+    def report(self, stats):
+        """Called with the ImportStats as the products are read"""
+
+    def parsed_products(self, stats):
+        """Yield the fields of the valid downloaded products,
+        counting the downloaded and rejected products in 'stats'"""
+        return self.parse_products(self.dl_products(stats.downloaded), stats)
+
+    def parse_products(self, products, stats):
+        """Yield the fields of the valid products,
+        counting the products and the rejected products in 'stats'"""
+        for product in products:
+            stats.downloaded += 1
+            self.report(stats)
+            fields = self.parse(product)
+            #  if the product doesn't contain the right info, go to the next
+            if fields is None:
+                stats.rejected += 1
+                continue
+            yield fields
+
+    def start_stats(self):
+        """Return the ImportStats of a new import,
+        or of the import resumed from the checkpoint.
+        The workers start again from the first page, so their import
+        doesn't count the products of the checkpoint"""
+        stats = ImportStats()
+        if self.checkpoint is not None and self.workers == 1:
+            stats.downloaded = self.checkpoint.offset
+            stats.rejected = self.checkpoint.rejected
+            stats.updated = self.checkpoint.updated
+            stats.unchanged = self.checkpoint.unchanged
+        return stats
+
+    def write_batches(self, stats, write, parsed=None):
+        """Download and parse the products, or take the 'parsed' products,
+        and write them with 'write', BATCH_SIZE at a time,
+        while the next pages are downloaded.
+        The checkpoint is saved in the same transaction as each batch"""
+        if parsed is None:
+            parsed = self.parsed_products(stats)
+        for batch in batches(parsed, BATCH_SIZE):
+            with transaction.atomic():
+                write(batch, stats)
+                if self.checkpoint is not None:
+                    self.checkpoint.record(stats)
+
+    def insert_batch(self, batch, stats):
+        """Insert a batch of parsed products.
+        The products conflicting with a saved product on the code,
+        the name or the link are ignored by the database"""
+        Product.objects.bulk_create(
+            [Product(**fields) for fields in batch], ignore_conflicts=True)
+
+    def partitions(self):
+        """Yield the parts of the import shared by the workers: the numbers
+        and sizes of the pages"""
+        sizes = self.downloader.page_sizes(self.nb_products)
+        yield from zip(range(1, len(sizes) + 1), sizes)
+
+    def read_part(self, part):
+        """Download the products of a page, in a worker process"""
+        page, page_size = part
+        return self.dl_page(page_size, page)
+
+    def write_in_workers(self, stats, write):
+        """Share the parts of the import between 'workers' processes,
+        which read, parse and write them, and add their counters to 'stats'.
+        At most two parts per worker are sent ahead, so the parts
+        don't pile up in memory.
+        The connections are closed first, so the workers don't share them"""
+        connections.close_all()
+        pending = deque()
+        with ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context('fork'),
+                initializer=init_worker,
+                initargs=(type(self), self.worker_options)) as executor:
+            for part in self.partitions():
+                if len(pending) == 2 * self.workers:
+                    stats.merge(pending.popleft().result())
+                    self.report(stats)
+                pending.append(
+                    executor.submit(import_part, write.__name__, part))
+            while pending:
+                stats.merge(pending.popleft().result())
+                self.report(stats)
+
+    def load_products(self, stats):
+        """Download the products and insert them in the database"""
+        self.write_batches(stats, self.insert_batch)
+
+    def import_products(self, write):
+        """Download the products and write them with 'write',
+        then refresh the substitutes.
+        If the import fails, the error is saved in the checkpoint.
+        Return the ImportStats of the import"""
+        stats = self.start_stats()
+        start = time.perf_counter()
+        if self.checkpoint is not None:
+            initial_count = self.checkpoint.initial_count
+        else:
+            initial_count = Product.objects.count()
+        try:
+            if self.workers > 1:
+                self.write_in_workers(stats, write)
+            else:
+                self.write_batches(stats, write)
+        except Exception as error:
+            if self.checkpoint is not None:
+                self.checkpoint.fail(error)
+            raise
+        stats.inserted = Product.objects.count() - initial_count
+        #  the statistics of the new rows, for the planner and the random pool
+        analyze_products()
+        compute_substitutes()
+        Catalog.bump()
+        if self.checkpoint is not None:
+            self.checkpoint.finished = True
+            self.checkpoint.save()
+        stats.duration = time.perf_counter() - start
+        return stats
 
     def insert_products(self):
         """Launch 'dl_products' to download the products from OpenFoodfacts.org
-        then insert the products in the database"""
-        products_list = self.dl_products()
-        for product in products_list:
-            #  if the product doesn't contain the right info, go to the next
-            try:
-                code = product["code"]
-                nutriscore = product["nutrition_grade_fr"].lower()
-                categories = product["categories_tags"]
-                name = product["product_name"].title()
-                link = product["url"]
-                image = product["image_front_small_url"]
-            except KeyError as error:
+        then insert the products in the database.
+        Return the ImportStats of the import"""
+        return self.import_products(self.insert_batch)
+
+    def rebuild_products(self):
+        """Launch 'dl_products' to download the products from OpenFoodfacts.org
+        then load them in a new catalog, beside the live catalog.
+        Once its indexes and substitutes are built, the new catalog
+        replaces the live catalog in a single transaction.
+        The products saved by the users are kept.
+        Return the ImportStats of the rebuild"""
+        stats = ImportStats()
+        start = time.perf_counter()
+        create_staging()
+        try:
+            self.load_products(stats)
+            stats.inserted = Product.objects.count()
+            keep_favorite_products()
+            compute_substitutes(incremental=False)
+            build_indexes()
+            swap_staging()
+        finally:
+            drop_staging()
+        Catalog.bump()
+        stats.duration = time.perf_counter() - start
+        return stats
+
+    def update_batch(self, batch, stats):
+        """Update the changed products of a batch of parsed products,
+        found by their content hash, and insert the new products.
+        The products whose categories, nutriscore or nutrients changed
+        get their substitutes computed again"""
+        #  the current hash, substitutes state, nutriscore, categories
+        #  and nutrients of the products
+        current = {
+            row[0]: row[1:] for row in Product.objects.filter(
+                code__in=[fields['code'] for fields in batch])
+            .values_list(
+                'code', 'content_hash', 'substitutes_stale',
+                'nutriscore', 'categories', *NUTRIENT_FIELDS)}
+        new = []
+        changed = []
+        for fields in batch:
+            if fields['code'] not in current:
+                new.append(Product(**fields))
                 continue
-            nutrient_levels = get_nutrients(product)
-            #  if the product can't be inserted, go to the next
-            try:
-                with transaction.atomic():
-                    Product.objects.create(
-                        code=code,
-                        nutriscore=nutriscore,
-                        categories=categories,
-                        name=name, link=link, image=image,
-                        nutrient_levels=nutrient_levels)
-            except (IntegrityError, DataError) as error:
+            saved_hash, stale, *compared = current[fields['code']]
+            if saved_hash == fields['content_hash']:
+                stats.unchanged += 1
                 continue
+            fields['substitutes_stale'] = stale or compared != [
+                fields['nutriscore'], fields['categories'],
+                *(fields[field] for field in NUTRIENT_FIELDS)]
+            changed.append(Product(**fields))
+        Product.objects.bulk_create(new, ignore_conflicts=True)
+        try:
+            with transaction.atomic():
+                Product.objects.bulk_update(changed, UPDATED_FIELDS)
+            stats.updated += len(changed)
+        except (IntegrityError, DataError):
+            #  a product took the name or the link of another one,
+            #  update the products one by one to skip only the conflicts
+            for product in changed:
+                try:
+                    with transaction.atomic():
+                        product.save(update_fields=UPDATED_FIELDS)
+                except (IntegrityError, DataError) as error:
+                    print("Warning, catched error while updating the "
+                          "database: " + str(error))
+                    continue
+                stats.updated += 1
 
     def update_products(self):
         """Launch 'dl_products' to download the products from OpenFoodfacts.org
-        then update the products in the database"""
-        products_list = self.dl_products()
-        for product in products_list:
-            #  if the product doesn't contain the right info, go to the next
-            try:
-                code = product["code"]
-                nutriscore = product["nutrition_grade_fr"].lower()
-                categories = product["categories_tags"]
-                name = product["product_name"].title()
-                link = product["url"]
-                image = product["image_front_small_url"]
-            except KeyError as error:
-                continue
-            nutrient_levels = get_nutrients(product)
-            try:
-                with transaction.atomic():
-                    Product.objects.filter(code=product['code']).update(
-                        nutriscore=nutriscore,
-                        categories=categories,
-                        name=name, link=link, image=image,
-                        nutrient_levels=nutrient_levels)
-            except (Product.DoesNotExist, IntegrityError, DataError) as error:
-                print("Warning, catched error while updating the database: " + 
-                    str(error))
-                continue
+        then update the changed products and insert the new products
+        in the database.
+        Return the ImportStats of the update"""
+        return self.import_products(self.update_batch)
@@ -0,0 +1,9 @@
+import hashlib
+import json
+
+
+def content_hash(values):
+    """Hash of a list of values which can be serialized in JSON,
+    to detect the products changed since the last import"""
+    serialized = json.dumps(values, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.md5(serialized.encode('utf-8')).hexdigest()
@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from ..models import Catalog, PopularQuery, Product, SearchLog
+from .search import search_products
+from .text import normalize
+
+#  The counted queries are written every FLUSH_INTERVAL seconds,
+#  or as soon as FLUSH_SIZE searches are counted
+FLUSH_INTERVAL = 60
+FLUSH_SIZE = 1000
+#  Number of popular queries kept, and number of days of searches counted
+NB_POPULAR_QUERIES = 1000
+WINDOW_DAYS = 30
+
+
+class SearchLogger:
+    """Count the searched queries in memory, and write the counts
+    in the SearchLog table in a background thread, so the requests
+    never wait for the database.
+    The queries counted since the last write are lost if the process stops.
+    The searches aren't counted while 'enabled' is False"""
+
+    def __init__(self):
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._size = 0
+        self._flushed_at = time.monotonic()
+        self._flushing = threading.Lock()
+
+    def log(self, query):
+        """Count a search of the query"""
+        query = normalize(query.strip())[:200]
+        if not (query and self.enabled):
+            return
+        with self._lock:
+            self._counts[query] += 1
+            self._size += 1
+            due = (self._size >= FLUSH_SIZE
+                   or time.monotonic() - self._flushed_at > FLUSH_INTERVAL)
+        if due and self._flushing.acquire(blocking=False):
+            threading.Thread(target=self._flush, daemon=True).start()
+
+    def take(self):
+        """Return the counts {query: searches} not written yet,
+        and reset them"""
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._size = 0
+            self._flushed_at = time.monotonic()
+        return counts
+
+    def flush(self):
+        """Write the counts not written yet, in a single query"""
+        SearchLog.objects.bulk_create([
+            SearchLog(query=query, count=count)
+            for query, count in self.take().items()])
+
+    def _flush(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+            self._flushing.release()
+
+
+search_logger = SearchLogger()
+
+
+def aggregate_queries(limit, count=NB_POPULAR_QUERIES, days=WINDOW_DAYS):
+    """Replace the popular queries by the 'count' queries searched
+    the most during the last 'days' days, with their first 'limit' results
+    in the current catalog. The older searches are deleted"""
+    SearchLog.objects.filter(
+        logged_at__lt=timezone.now() - timedelta(days=days)).delete()
+    top = (
+        SearchLog.objects
+        .values_list('query')
+        .annotate(total=Sum('count'))
+        .order_by('-total', 'query')[:count])
+    generation = Catalog.current_generation()
+    popular = [
+        PopularQuery(
+            query=query, count=total, generation=generation,
+            products=[product.code for product
+                      in search_products(query, limit)])
+        for query, total in top]
+    with transaction.atomic():
+        PopularQuery.objects.all().delete()
+        PopularQuery.objects.bulk_create(popular)
+    return popular
+
+
+def popular_results(query, limit, generation):
+    """Return the precomputed results of a normalized query if it is
+    popular in the catalog 'generation', or None"""
+    codes = (
+        PopularQuery.objects
+        .filter(query=query, generation=generation)
+        .values_list('products', flat=True)
+        .first())
+    if codes is None:
+        return None
+    products = Product.objects.in_bulk(codes[:limit])
+    return [products[code] for code in codes[:limit] if code in products]
+
+
+def popularity_version():
+    """Return a value changing each time the popular queries
+    are aggregated: the last primary key of the table"""
+    return PopularQuery.objects.aggregate(version=Max('pk'))['version']
+
+
+def product_popularity():
+    """Return a dict {code: popularity} of the products found by the
+    popular queries: the number of searches of each query,
+    divided by the position of the product in its results"""
+    popularity = defaultdict(float)
+    for count, codes in PopularQuery.objects.values_list('count', 'products'):
+        for position, code in enumerate(codes, start=1):
+            popularity[code] += count / position
+    return popularity
@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+
+from django.db import connection
+
+from ..models import Product
+from .catalog import VersionedIndex
+
+#  Number of random codes kept in memory
+POOL_SIZE = 1000
+#  Number of seconds after which the pool is renewed in the background
+REFRESH_INTERVAL = 300
+
+
+def estimated_count():
+    """Number of products estimated by Postgres statistics, without counting.
+    Returns 0 if the table was never analyzed"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+            [Product._meta.db_table])
+        row = cursor.fetchone()
+    return max(int(row[0]), 0) if row else 0
+
+
+def analyze_products():
+    """Update the statistics of the products table, after an import"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE "{Product._meta.db_table}"')
+
+
+def sample_codes(size):
+    """Return about 'size' random product codes, without sorting the table.
+    On a large table, TABLESAMPLE only reads a fraction of its pages,
+    so the cost doesn't grow with the catalog.
+    A small estimate may come from a table not analyzed yet,
+    so the products are counted before sorting a small table randomly"""
+    count = estimated_count()
+    if count <= 2 * size:
+        count = Product.objects.count()
+    if count <= 2 * size:
+        return list(Product.objects.order_by('?')
+                    .values_list('code', flat=True)[:size])
+    percent = 100 * 2 * size / count
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT code FROM "{Product._meta.db_table}" '
+            'TABLESAMPLE SYSTEM (%s)', [percent])
+        codes = [row[0] for row in cursor.fetchall()]
+    return random.sample(codes, min(size, len(codes)))
+
+
+class RandomPool(VersionedIndex):
+    """Pool of random product codes, from which the random products
+    are drawn in memory. The pool is rebuilt after each import,
+    and renewed in the background every REFRESH_INTERVAL seconds"""
+
+    def __init__(self):
+        super().__init__()
+        self._built_at = 0
+        self._refreshing = threading.Lock()
+
+    def build(self):
+        self._built_at = time.monotonic()
+        return sample_codes(POOL_SIZE)
+
+    def get(self):
+        codes = super().get()
+        if time.monotonic() - self._built_at > REFRESH_INTERVAL \
+                and self._refreshing.acquire(blocking=False):
+            threading.Thread(target=self._refresh, daemon=True).start()
+        return codes
+
+    def _refresh(self):
+        try:
+            version = self._version
+            codes = self.build()
+            with self._lock:
+                #  the pool may have been rebuilt for a newer catalog
+                if self._data is not None and self._version == version:
+                    self._data = codes
+        finally:
+            connection.close()
+            self._refreshing.release()
+
+    def draw(self, count):
+        """Return 'count' random products, or all the products
+        if there are less than 'count' in the database"""
+        codes = self.get()
+        candidates = random.sample(codes, len(codes))
+        products = []
+        while candidates and len(products) < count:
+            missing = count - len(products)
+            products += Product.objects.filter(pk__in=candidates[:missing])
+            candidates = candidates[missing:]
+        if len(products) < count:
+            #  the pool is too small or some products were deleted:
+            #  complete with a new sample, and renew the pool
+            if len(codes) >= count:
+                self.invalidate()
+            drawn = {product.pk for product in products}
+            others = [code for code in sample_codes(POOL_SIZE)
+                      if code not in drawn]
+            random.shuffle(others)
+            products += Product.objects.filter(
+                pk__in=others[:count - len(products)])
+        random.shuffle(products)
+        return products
+
+
+random_pool = RandomPool()
@@ -0,0 +1,27 @@
+import numpy as np
+
+#  Fields of Product storing the quantities of nutrients per 100g
+NUTRIENT_FIELDS = [
+    'fat_100g', 'saturated_fat_100g', 'sugars_100g', 'salt_100g']
+#  Quantities per 100g above which the level of a nutrient is high,
+#  to compare the differences of each nutrient on the same scale
+SCALES = np.array([17.5, 5, 22.5, 1.5])
+#  Penalty of a candidate for a nutrient missing in it or in the product
+MISSING_PENALTY = 1.0
+
+
+def nutrient_distances(initial, candidates):
+    """Distance between the nutrients of the initial product
+    (an array of shape (4,)) and each candidate (an array of shape (n, 4)),
+    computed for all the candidates at once"""
+    differences = (np.asarray(candidates, dtype=float) - initial) / SCALES
+    differences[np.isnan(differences)] = MISSING_PENALTY
+    return np.sqrt(np.square(differences).sum(axis=1))
+
+
+def rank_substitutes(initial, candidates, depths, nutriscores):
+    """Return the indices of the candidates, best substitute first:
+    the deepest shared category first, then the best nutriscore,
+    then the nutrients closest to the initial product"""
+    distances = nutrient_distances(initial, candidates)
+    return np.lexsort((distances, nutriscores, -np.asarray(depths)))
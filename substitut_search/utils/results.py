@@ -0,0 +1,161 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+
+from ..models import Catalog
+from .catalog import VersionedIndex
+from .hashing import content_hash
+
+#  Number of seconds the results are cached. The results of an older
+#  catalog are never read, since the generation is part of their keys
+RESULTS_CACHE_TIMEOUT = 24 * 3600
+#  Number of seconds a process computing a result holds its lock in the
+#  shared cache. After it, the waiting processes compute the result
+LOCK_TIMEOUT = 30
+#  Number of seconds between two reads of a result
+#  computed by another process
+POLL_INTERVAL = 0.05
+
+
+class CatalogGeneration(VersionedIndex):
+    """The catalog generation, read from the database
+    at most every CHECK_INTERVAL seconds"""
+
+    def build(self):
+        return Catalog.current_generation()
+
+
+catalog_generation = CatalogGeneration()
+
+
+class ResultCache:
+    """Cache the results of a computation on the products,
+    in the cache alias set by the setting RESULTS_CACHE: a local-memory
+    cache is kept by each process, a shared cache by all the processes.
+    The keys contain the catalog generation, so each import makes
+    the previous results unreachable, without deleting them.
+    A missing result is computed once: the other threads of the process
+    wait for it on a lock, the other processes on a lock in the cache.
+    With 'serve_stale', the result of the previous catalog is served
+    while the new result is computed by another request.
+    The counters count the lookups of this process: 'hits' found the
+    result, 'misses' computed it, 'coalesced' waited for another request
+    computing it, 'stale' got the result of the previous catalog"""
+
+    def __init__(self, name, timeout=RESULTS_CACHE_TIMEOUT,
+                 serve_stale=False):
+        self.name = name
+        self.timeout = timeout
+        self.serve_stale = serve_stale
+        self.hits = self.misses = self.coalesced = self.stale = 0
+        self._lock = threading.Lock()
+        #  {key: [lock, number of threads using it]} of the computed keys
+        self._flights = {}
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'RESULTS_CACHE', DEFAULT_CACHE_ALIAS)]
+
+    def key(self, *args):
+        """Key of the result for these arguments and the current catalog"""
+        generation = catalog_generation.get()
+        return f'results:{self.name}:{generation}:{content_hash(args)}'
+
+    def stale_key(self, *args):
+        """Key of the last result for these arguments, of any catalog"""
+        return f'results:{self.name}:stale:{content_hash(args)}'
+
+    def get_or_compute(self, compute, *args):
+        """Return the cached result of 'compute(*args)',
+        or compute it and cache it. The arguments must be serializable
+        in JSON, and the result can't be None"""
+        key = self.key(*args)
+        result = self.cache.get(key)
+        if result is not None:
+            self._count('hits')
+            return result
+        stale = None
+        if self.serve_stale:
+            stale = self.cache.get(self.stale_key(*args))
+        with self._flight(key) as flight:
+            #  another thread is computing the result: wait for it,
+            #  unless the stale result can be served
+            if not flight.acquire(blocking=stale is None):
+                self._count('stale')
+                return stale
+            try:
+                result = self.cache.get(key)
+                if result is not None:
+                    self._count('coalesced')
+                    return result
+                return self._compute_once(key, stale, compute, args)
+            finally:
+                flight.release()
+
+    def _compute_once(self, key, stale, compute, args):
+        """Compute the result, unless another process holds the lock
+        of the key in the cache: then wait for its result"""
+        lock_key = f'{key}:lock'
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        locked = self.cache.add(lock_key, 1, LOCK_TIMEOUT)
+        while not locked:
+            if stale is not None:
+                self._count('stale')
+                return stale
+            time.sleep(POLL_INTERVAL)
+            result = self.cache.get(key)
+            if result is not None:
+                self._count('coalesced')
+                return result
+            if time.monotonic() > deadline:
+                break
+            locked = self.cache.add(lock_key, 1, LOCK_TIMEOUT)
+        self._count('misses')
+        try:
+            result = compute(*args)
+            self.cache.set(key, result, self.timeout)
+            if self.serve_stale:
+                self.cache.set(self.stale_key(*args), result, self.timeout)
+        finally:
+            if locked:
+                self.cache.delete(lock_key)
+        return result
+
+    @contextmanager
+    def _flight(self, key):
+        """Yield the lock of a key shared by the threads of the process,
+        dropped when no thread uses it anymore"""
+        with self._lock:
+            flight = self._flights.setdefault(key, [threading.Lock(), 0])
+            flight[1] += 1
+        try:
+            yield flight[0]
+        finally:
+            with self._lock:
+                flight[1] -= 1
+                if not flight[1]:
+                    del self._flights[key]
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @property
+    def hit_ratio(self):
+        """Part of the lookups served without computing the result"""
+        lookups = self.hits + self.misses + self.coalesced + self.stale
+        return 1 - self.misses / lookups if lookups else 0
+
+    def clear(self):
+        """Remove all the entries of the results cache, reset the counters"""
+        self.cache.clear()
+        with self._lock:
+            self.hits = self.misses = self.coalesced = self.stale = 0
+
+
+search_results = ResultCache('search', serve_stale=True)
+find_results = ResultCache('find')
+detail_results = ResultCache('detail')
@@ -0,0 +1,28 @@
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from ..lookups import TrigramWordSimilarity
+from ..models import Product
+from .text import normalize
+
+
+def search_products(query, limit):
+    """Find the products whose names match the query, in a single query.
+    The names are compared without case and accents, using the trigram
+    index on 'search_name', so a query with typos still finds products.
+    The products whose names start with the query come first,
+    then the products are ranked by similarity with the query"""
+    query = normalize(query.strip())
+    starts_with = Case(
+        When(search_name__startswith=query, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField())
+    return list(
+        Product.objects
+        .filter(
+            Q(search_name__trigram_word_similar=query)
+            | Q(search_name__contains=query))
+        .annotate(
+            starts_with=starts_with,
+            similarity=TrigramWordSimilarity(query, 'search_name'))
+        .order_by('-starts_with', '-similarity', 'name')
+        [:limit])
@@ -0,0 +1,123 @@
+from django.db import connection, transaction
+
+from ..models import Favory, Product, ProductSubstitute
+from .favories import invalidate_tags
+
+#  Schema where the new catalog is loaded, then the old catalog is moved
+STAGING_SCHEMA = 'catalog_staging'
+OLD_SCHEMA = 'catalog_old'
+#  Models of the catalog, rebuilt together
+STAGED_MODELS = [Product, ProductSubstitute]
+
+
+def table(schema, model):
+    """Qualified name of the table of a model in a schema"""
+    quote = connection.ops.quote_name
+    return f'{quote(schema)}.{quote(model._meta.db_table)}'
+
+
+def favory_foreign_key():
+    """Name of the foreign key of Favory referencing Product"""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, Favory._meta.db_table)
+    column = Favory._meta.get_field('product').column
+    return next(
+        name for name, constraint in constraints.items()
+        if constraint['foreign_key'] and constraint['columns'] == [column])
+
+
+def create_staging():
+    """Create the empty catalog tables in the staging schema, without
+    their search indexes, and use them instead of the live tables
+    until 'drop_staging' is called.
+    The live tables stay untouched and keep serving the requests"""
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP SCHEMA IF EXISTS {quote(STAGING_SCHEMA)} CASCADE')
+        cursor.execute(f'CREATE SCHEMA {quote(STAGING_SCHEMA)}')
+        #  the unqualified table names now point to the staging tables,
+        #  and to the live tables for the other models
+        cursor.execute(f'SET search_path TO {quote(STAGING_SCHEMA)}, public')
+    with connection.schema_editor() as editor:
+        for model in STAGED_MODELS:
+            editor.create_model(model)
+    #  the search indexes are built once the products are loaded
+    with connection.cursor() as cursor:
+        for index in Product._meta.indexes:
+            cursor.execute(
+                f'DROP INDEX {quote(STAGING_SCHEMA)}.{quote(index.name)}')
+
+
+def keep_favorite_products():
+    """Copy in the staging catalog the products saved by the users
+    which are missing in the new catalog, to keep their favories"""
+    columns = ', '.join(
+        connection.ops.quote_name(field.column)
+        for field in Product._meta.concrete_fields)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table(STAGING_SCHEMA, Product)} ({columns}) '
+            f'SELECT {columns} FROM {table("public", Product)} '
+            f'WHERE code IN (SELECT product_id FROM '
+            f'{table("public", Favory)}) '
+            'ON CONFLICT DO NOTHING')
+
+
+def build_indexes():
+    """Build the search indexes of the staging catalog,
+    and update its statistics for the query planner"""
+    with connection.schema_editor() as editor:
+        for index in Product._meta.indexes:
+            editor.add_index(Product, index)
+    with connection.cursor() as cursor:
+        for model in STAGED_MODELS:
+            cursor.execute(f'ANALYZE {table(STAGING_SCHEMA, model)}')
+
+
+def swap_staging():
+    """Replace the live catalog by the staging catalog in a single
+    transaction, so the requests see either the old or the new catalog.
+    The favories are kept by product code, except the favories
+    of the products which couldn't be kept in the new catalog"""
+    quote = connection.ops.quote_name
+    foreign_key = quote(favory_foreign_key())
+    favories = table('public', Favory)
+    with transaction.atomic(), connection.cursor() as cursor:
+        #  a constraint can't be dropped with deferred checks pending
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(
+            f'DELETE FROM {favories} WHERE product_id NOT IN '
+            f'(SELECT code FROM {table(STAGING_SCHEMA, Product)}) '
+            'RETURNING user_profile_id')
+        profiles = {row[0] for row in cursor.fetchall()}
+        cursor.execute(f'ALTER TABLE {favories} DROP CONSTRAINT {foreign_key}')
+        cursor.execute(f'DROP SCHEMA IF EXISTS {quote(OLD_SCHEMA)} CASCADE')
+        cursor.execute(f'CREATE SCHEMA {quote(OLD_SCHEMA)}')
+        for model in STAGED_MODELS:
+            cursor.execute(
+                f'ALTER TABLE {table("public", model)} '
+                f'SET SCHEMA {quote(OLD_SCHEMA)}')
+        for model in STAGED_MODELS:
+            cursor.execute(
+                f'ALTER TABLE {table(STAGING_SCHEMA, model)} SET SCHEMA public')
+        #  NOT VALID doesn't check the favories while the tables are locked
+        cursor.execute(
+            f'ALTER TABLE {favories} ADD CONSTRAINT {foreign_key} '
+            f'FOREIGN KEY (product_id) REFERENCES {table("public", Product)} '
+            '(code) DEFERRABLE INITIALLY DEFERRED NOT VALID')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'ALTER TABLE {favories} VALIDATE CONSTRAINT {foreign_key}')
+        cursor.execute(f'DROP SCHEMA {quote(OLD_SCHEMA)} CASCADE')
+    invalidate_tags(profiles)
+
+
+def drop_staging():
+    """Use the live tables again, and drop what remains
+    of the staging schema"""
+    with connection.cursor() as cursor:
+        cursor.execute('RESET search_path')
+        cursor.execute(
+            'DROP SCHEMA IF EXISTS '
+            f'{connection.ops.quote_name(STAGING_SCHEMA)} CASCADE')
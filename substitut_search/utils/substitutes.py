@@ -0,0 +1,141 @@
+from django.db import transaction
+from django.db.models.expressions import RawSQL
+
+from ..models import Product, ProductSubstitute
+from .category_index import category_index, load_category_index
+from .ranking import MISSING_PENALTY, NUTRIENT_FIELDS, SCALES
+
+#  Number of substitutes precomputed for each product
+NB_SUBSTITUTES = 12
+BATCH_SIZE = 1000
+#  Above this share of stale products, all the substitutes are computed,
+#  instead of searching the products affected by the changes
+FULL_COMPUTE_SHARE = 0.2
+
+
+def nutrient_distance(product):
+    """SQL expression of the distance between the nutrients of each
+    product and the given one, as computed by 'nutrient_distances'"""
+    terms, params = [], []
+    for field, scale in zip(NUTRIENT_FIELDS, SCALES):
+        value = getattr(product, field)
+        if value is None:
+            terms.append('%s')
+            params.append(MISSING_PENALTY ** 2)
+        else:
+            terms.append(
+                f'coalesce(power(("{Product._meta.db_table}"."{field}" - %s)'
+                ' / %s, 2), %s)')
+            params.extend((value, float(scale), MISSING_PENALTY ** 2))
+    return RawSQL(f"sqrt({' + '.join(terms)})", params)
+
+
+def search_substitutes(product, limit, max_levels=None):
+    """Find the substitutes of a product in the database, in a single query.
+    The products sharing a category with the initial product and having
+    a better nutriscore are ranked by the depth of the smaller category
+    they share with it, then by nutriscore, so the search still starts
+    from the smaller category, then by nutrients.
+    Only the displayed fields are fetched.
+    'max_levels', like {'sugars_level': 0}, keeps only the candidates
+    with at most these levels of nutrients"""
+    #  position of the deepest category shared with the initial product
+    depth = RawSQL(
+        "(SELECT max(array_position(%s, category::text)) "
+        f'FROM unnest("{Product._meta.db_table}"."categories") AS category)',
+        (product.categories,))
+    levels = {f'{field}__lte': level
+              for field, level in (max_levels or {}).items()}
+    return list(
+        Product.objects
+        .filter(categories__overlap=product.categories)
+        .filter(nutriscore__lt=product.nutriscore)
+        .filter(**levels)
+        .annotate(depth=depth, distance=nutrient_distance(product))
+        .order_by('-depth', 'nutriscore', 'distance', 'code')
+        .only('code', 'name', 'image', 'nutriscore', *NUTRIENT_FIELDS)
+        [:limit])
+
+
+def find_substitutes(product, limit, max_levels=None):
+    """Return the substitutes of a product, from the in-memory category
+    index if it is enabled, else from the precomputed table if they are
+    up to date, else from a query.
+    The substitutes filtered by 'max_levels' are always queried"""
+    if max_levels:
+        return search_substitutes(product, limit, max_levels)
+    substitutes = category_index.find(product, limit)
+    if substitutes is not None:
+        return substitutes
+    if product.substitutes_stale or limit > NB_SUBSTITUTES:
+        return search_substitutes(product, limit)
+    return list(
+        Product.objects
+        .filter(substituted_links__product=product)
+        .order_by('substituted_links__rank')[:limit])
+
+
+class SubstitutesComputer:
+    """Compute the substitutes of many products at once, in memory,
+    with a CategoryIndex of all the products, without their names
+    and images"""
+
+    def __init__(self):
+        self.index = load_category_index(displayed=False)
+
+    @property
+    def codes(self):
+        return self.index.numbers.keys()
+
+    def substitutes(self, code):
+        """Return the codes of the substitutes of the product, best first"""
+        return [self.index.codes[number]
+                for number in self.index.find(code, NB_SUBSTITUTES)]
+
+    def affected_by(self, codes):
+        """Return the codes of the products whose substitutes may change
+        when the given products changed: the products themselves,
+        the products they can now substitute and the products
+        they were substituting"""
+        affected = set(codes) | self.index.worse(codes)
+        for start in range(0, len(codes), BATCH_SIZE):
+            affected.update(
+                ProductSubstitute.objects
+                .filter(substitute__in=codes[start:start+BATCH_SIZE])
+                .values_list('product', flat=True))
+        return affected & self.codes
+
+    def save(self, codes):
+        """Replace the precomputed substitutes of the given products"""
+        codes = list(codes)
+        for start in range(0, len(codes), BATCH_SIZE):
+            batch = codes[start:start+BATCH_SIZE]
+            links = [
+                ProductSubstitute(product_id=code, substitute_id=sbt, rank=rank)
+                for code in batch
+                for rank, sbt in enumerate(self.substitutes(code))]
+            with transaction.atomic():
+                ProductSubstitute.objects.filter(product__in=batch).delete()
+                ProductSubstitute.objects.bulk_create(links)
+                Product.objects.filter(code__in=batch) \
+                               .update(substitutes_stale=False)
+        return len(codes)
+
+
+def compute_substitutes(incremental=True):
+    """Precompute the substitutes of the products.
+    If incremental, only the products marked as stale and
+    the products affected by their changes are computed, unless
+    the stale products are more than FULL_COMPUTE_SHARE of the catalog,
+    as after a full import.
+    Returns the number of products computed"""
+    computer = SubstitutesComputer()
+    if incremental:
+        stale = list(Product.objects.filter(substitutes_stale=True)
+                     .values_list('code', flat=True))
+        incremental = len(stale) <= FULL_COMPUTE_SHARE * len(computer.codes)
+    if incremental:
+        codes = computer.affected_by(stale)
+    else:
+        codes = computer.codes
+    return computer.save(codes)
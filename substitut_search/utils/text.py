@@ -0,0 +1,9 @@
+import unicodedata
+
+
+def normalize(text):
+    """Lowercase a text and strip its accents,
+    so product names can be compared regardless of case and accents"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return stripped.lower()
@@ -0,0 +1,76 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.db.models import Count
+from django.http import Http404
+from django.test import RequestFactory
+
+from ..models import PopularQuery, Product
+from .results import find_results
+
+#  Number of products whose substitutes and informations are warmed
+NB_PRODUCTS = 100
+#  Number of popular queries whose results are warmed
+NB_QUERIES = 100
+#  Number of pages requested at the same time
+WORKERS = 4
+#  Error of the commands warming a cache the web workers don't read
+LOCAL_CACHE_ERROR = (
+    'The setting RESULTS_CACHE is a local-memory cache: the web workers '
+    "wouldn't read the warmed results. Use a shared cache backend")
+
+
+def shared_results():
+    """Return True if the results cache is shared by the processes,
+    so the web workers read the results warmed by a command.
+    A local-memory cache is dropped when the command exits"""
+    return not isinstance(find_results.cache, LocMemCache)
+
+
+def top_products(count):
+    """Return the codes of the 'count' products saved by the most users"""
+    return list(
+        Product.objects
+        .annotate(saves=Count('favory'))
+        .order_by('-saves', 'code')
+        .values_list('code', flat=True)[:count])
+
+
+def top_queries(count):
+    """Return the 'count' queries searched the most"""
+    return list(
+        PopularQuery.objects
+        .order_by('-count', 'query')
+        .values_list('query', flat=True)[:count])
+
+
+def warm_page(view, params):
+    """Request a page as an anonymous user, so its results are cached,
+    and return the number of seconds it took"""
+    request = RequestFactory().get('/', params)
+    request.user = AnonymousUser()
+    start = time.perf_counter()
+    try:
+        view(request)
+    except Http404:
+        pass
+    duration = time.perf_counter() - start
+    #  each page is requested in a thread of the pool
+    connection.close()
+    return duration
+
+
+def warm_pages(pages, workers=WORKERS):
+    """Request the pages, a list of (name, view, params), 'workers'
+    pages at a time, and return a dict {name: durations of the requests}"""
+    durations = {name: [] for name, view, params in pages}
+    with ThreadPoolExecutor(workers) as executor:
+        futures = [
+            (name, executor.submit(warm_page, view, params))
+            for name, view, params in pages]
+        for name, future in futures:
+            durations[name].append(future.result())
+    return durations
@@ -1,15 +1,116 @@
+from functools import wraps
+
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
 
 from .models import Product, Favory
+from .utils.autocomplete import prefix_index
+from .utils.favories import (
+    DEFAULT_TAG, count_tags, first_pages, get_tags, saved_products, tag_page)
+from .utils.hashing import content_hash
+from .utils.queries import popular_results, search_logger
+from .utils.random_pool import random_pool
+from .utils.results import (
+    catalog_generation, detail_results, find_results, search_results)
+from .utils.search import search_products
+from .utils.substitutes import find_substitutes
+from .utils.text import normalize
 
 NB_DISPLAYED_PRODUCTS = 12
+NB_SUGGESTIONS = 8
+#  Number of seconds the browsers and the proxies reuse a product page
+#  before asking if it changed
+PAGE_MAX_AGE = 300
+#  The values of the GET parameter 'low' of the substituts,
+#  and the nutrient levels they filter
+LOW_NUTRIENTS = {
+    level_field[:-len("_level")]: (name, level_field)
+    for name, level_field, quantity_field in Product.nutrients}
+
+def product_updated_at(request):
+    """Return the last change of the requested product, or None if it
+    doesn't exist, read once per request with the primary key index"""
+    if not hasattr(request, "product_updated_at"):
+        request.product_updated_at = Product.objects \
+            .filter(pk=request.GET.get("product_id")) \
+            .values_list("updated_at", flat=True).first()
+    return request.product_updated_at
+
+def detail_etag(request):
+    """The product informations change with the product,
+    the navigation bar with the user"""
+    updated_at = product_updated_at(request)
+    if updated_at is None:
+        return None
+    return content_hash([
+        request.GET.get("product_id"), updated_at.isoformat(),
+        request.user.is_authenticated])
+
+def detail_last_modified(request):
+    """Only the anonymous pages can be checked by date"""
+    if request.user.is_authenticated:
+        return None
+    return product_updated_at(request)
+
+def low_nutrients(request):
+    """Return the sorted nutrients whose level the substituts must have
+    low, given by the GET parameter 'low', like ?low=sugars&low=salt"""
+    return sorted(
+        set(request.GET.getlist("low")).intersection(LOW_NUTRIENTS))
+
+def find_etag(request):
+    """The substituts change with the catalog generation and the filters.
+    The pages of the users, showing their tags and saved products,
+    are always rendered"""
+    updated_at = product_updated_at(request)
+    if updated_at is None or request.user.is_authenticated:
+        return None
+    return content_hash([
+        request.GET.get("product_id"), updated_at.isoformat(),
+        catalog_generation.get(), low_nutrients(request)])
+
+def conditional_page(etag_func=None, last_modified_func=None):
+    """Decorate a view to answer the conditional requests with a 304,
+    without rendering the page. The anonymous pages can be reused
+    by the browsers and the proxies for PAGE_MAX_AGE seconds,
+    the pages of the users must be checked by their browser each time,
+    like the pages containing a CSRF token, which is secret"""
+    def decorator(view):
+        conditional_view = condition(etag_func, last_modified_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                if request.user.is_authenticated \
+                        or request.META.get("CSRF_COOKIE_USED"):
+                    patch_cache_control(response, private=True, no_cache=True)
+                else:
+                    patch_cache_control(
+                        response, public=True, max_age=PAGE_MAX_AGE)
+                patch_vary_headers(response, ["Cookie"])
+            return response
+        return wrapper
+    return decorator
+
+def query_products(query, limit):
+    """Return the precomputed results of a popular query, or search them"""
+    products = popular_results(query, limit, catalog_generation.get())
+    if products is None:
+        products = search_products(query, limit)
+    return products
 
 def search(request):
     """
     Takes a request GET with a query
-    Displays products whose names contains the query
+    Displays the products whose names match the query,
+    ranked by similarity and tolerating typos
     Displays 12 random products if the query is empty
+    The searched queries are counted, and the results of a query
+    are cached until the next import
 
     Template: "substitut_search/search.html"
     Context: {"products": a list of products, "query": the initial query}
@@ -17,89 +118,111 @@ def search(request):
     query = request.GET.get("query")
     if not query:
         query = "Produits aléatoires"
-        products = Product.objects.order_by('?')[:NB_DISPLAYED_PRODUCTS]
+        products = random_pool.draw(NB_DISPLAYED_PRODUCTS)
     else:
-        #  Fetch the products whose names starts with the query
-        products = list(
-            Product.objects.filter(name__istartswith=query)
-            [:NB_DISPLAYED_PRODUCTS])
-        #  If there is not enough products,
-        #  add the products whose names contains the query
-        len_products = len(products)
-        if len_products < NB_DISPLAYED_PRODUCTS:
-            products2 = Product.objects.exclude(name__istartswith=query)
-            #  Split the query to search the words separately
-            for word in query.split():
-                products2 = products2.filter(name__icontains=word)
-            products += list(products2[:NB_DISPLAYED_PRODUCTS-len_products])
+        search_logger.log(query)
+        products = search_results.get_or_compute(
+            query_products, normalize(query.strip()), NB_DISPLAYED_PRODUCTS)
 
     context = {"products": products, "query": query}
     return render(request, "substitut_search/search.html", context)
 
+def autocomplete(request):
+    """
+    Takes a request GET with a query
+    Returns the products whose names start with the query,
+    ranked by nutriscore, using the in-memory prefix index
+
+    Response: JSON {"products": a list of {"code", "name", "nutriscore"}}
+    """
+    query = request.GET.get("query", "").strip()
+    products = prefix_index.lookup(query, NB_SUGGESTIONS) if query else []
+    return JsonResponse({"products": products})
+
+def product_substitutes(product_pk, limit, low):
+    """Return the product and its substitutes with a low level
+    of the 'low' nutrients, or raise Http404"""
+    product = get_object_or_404(Product, pk=product_pk)
+    max_levels = {LOW_NUTRIENTS[nutrient][1]: 0 for nutrient in low}
+    return product, find_substitutes(product, limit, max_levels)
+
+@conditional_page(etag_func=find_etag)
 def find(request):
     """
-    Takes a request GET with a product pk
+    Takes a request GET with a product pk, and optionally the nutrients
+    the substituts must have in low quantity, like ?low=sugars&low=salt
     Displays substituts to the initial product
+    The product and its substituts are cached until the next import,
+    the tags and the saved products of the user are not
+    Answers 304 if the anonymous page didn't change since the last request
 
     Template: "substitut_search/find.html"
     Context: {
         "initial_product": the product in the initial search,
-        "products": a list of the products found as substituts}
+        "products": a list of the products found as substituts,
+        "fav_tags": the tags of the user favories,
+        "saved": the codes of the substituts saved by the user,
+        "low_choices": a list of (nutrient, name) of the filters,
+        "low": the filtered nutrients}
     """
     product_pk = request.GET.get("product_id")
-    product = get_object_or_404(Product, pk=product_pk)
-    substituts = []
-    max_sbts = NB_DISPLAYED_PRODUCTS
-    #  search in categories, starting from the smaller
-    #  until enough substituts are found
-    for category in reversed(product.categories):
-        #  find the products in the category with a better nutriscore
-        cat_sbts = Product.objects \
-                          .filter(categories__contains=[category]) \
-                          .filter(nutriscore__lt=product.nutriscore) \
-                          .order_by('nutriscore')
-        #  add the products in the result list, without exceed the max
-        for sbt in cat_sbts:
-            if len(substituts) < max_sbts and sbt not in substituts:
-                substituts.append(sbt)
-        #  if the result list have enough products, end the search
-        if len(substituts) >= max_sbts:
-            break
-    fav_tags = ["Non classé"]
+    low = low_nutrients(request)
+    product, substituts = find_results.get_or_compute(
+        product_substitutes, product_pk, NB_DISPLAYED_PRODUCTS, low)
+    fav_tags = [DEFAULT_TAG]
+    saved = set()
     user = request.user
     if user.is_authenticated:
-        for fav in Favory.objects.filter(user_profile=user.profile):
-            tag = fav.tag
-            if tag not in fav_tags:
-                fav_tags.append(tag)
+        fav_tags = get_tags(user.profile)
+        saved = saved_products(user.profile, substituts)
     context = {
         "initial_product": product,
         "products": substituts,
-        "fav_tags": sorted(fav_tags)
+        "fav_tags": fav_tags,
+        "saved": saved,
+        "low_choices": [
+            (nutrient, name) for nutrient, (name, level_field)
+            in LOW_NUTRIENTS.items()],
+        "low": low
         }
     return render(request, "substitut_search/find.html", context)
 
+def product_detail(product_pk):
+    """Return the rendered informations of a product, or raise Http404"""
+    product = get_object_or_404(Product, pk=product_pk)
+    return render_to_string(
+        "substitut_search/product_detail.html", {"product": product})
+
+@conditional_page(
+    etag_func=detail_etag, last_modified_func=detail_last_modified)
 def detail(request):
     """
     Takes a request GET with a product pk
     Displays the informations of the product
+    The informations are rendered once, then cached until the next import
+    Answers 304 if the product didn't change since the last request
 
     Template: "substitut_search/detail.html"
-    Context: {"product": the searched product}
+    Context: {"product_detail": the rendered informations of the product}
     """
     product_pk = request.GET.get("product_id")
-    product = get_object_or_404(Product, pk=product_pk)
+    html = detail_results.get_or_compute(product_detail, product_pk)
     return render(
-        request, "substitut_search/detail.html", {"product": product})
+        request, "substitut_search/detail.html", {"product_detail": html})
 
 def favories(request):
     """
     Takes a request GET or POST with a product pk
     If the method is POST, save the product in the user favories
-    Else, displays the saved products of the user
+    Else, if a tag is given, returns a page of the products saved in the tag
+    Else, displays the first page of the saved products of each tag
 
     Template: "substitut_search/favories.html"
-    Context: {"products": a list of the products saved by the user}
+    Context: {
+        "fav_dict": a dict {tag: first page of the products saved in the tag},
+        "more_tags": the tags with more products than the first page}
+    Template with a tag: "substitut_search/favories_page.html"
+    Context: {"products": the products of the requested page}
     """
     user = request.user
     #  a user need to be authenticated to access this page
@@ -116,15 +239,28 @@ def favories(request):
         Favory.objects.create(**fav_args)
         #  return an HttpResponse which will be displayed by a jquerry script
         return HttpResponse("Produit sauvegardé")
-    #  if the request method isn't POST, display the saved products of the user
-    fav_dict = {"Non classé": []}
-    for favory in Favory.objects \
-                        .filter(user_profile=user.profile) \
-                        .order_by('tag', '-saved_at'):
-        tag = favory.tag
-        if tag in fav_dict.keys():
-            fav_dict[tag].append(favory.product)
-        else:
-            fav_dict[tag] = [favory.product]
+    #  if a tag is given, return the requested page of the products
+    #  saved in this tag, which will be displayed by a jquerry script
+    tag = request.GET.get('tag')
+    if tag is not None:
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        products, more = tag_page(
+            user.profile, tag, page, NB_DISPLAYED_PRODUCTS)
+        response = render(
+            request, "substitut_search/favories_page.html",
+            {'products': products, 'save': False,
+             'button_title': 'Voir le produit', 'action': 'substitut:detail'})
+        response['X-Has-More'] = int(more)
+        return response
+    #  else, display the first page of the saved products of each tag
+    fav_dict = {DEFAULT_TAG: []}
+    fav_dict.update(first_pages(user.profile, NB_DISPLAYED_PRODUCTS))
+    more_tags = [
+        tag for tag, count in count_tags(user.profile).items()
+        if count > NB_DISPLAYED_PRODUCTS]
     return render(
-        request, "substitut_search/favories.html", {'fav_dict': fav_dict})
+        request, "substitut_search/favories.html",
+        {'fav_dict': fav_dict, 'more_tags': more_tags})